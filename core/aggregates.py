@@ -0,0 +1,158 @@
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import Date, cast, delete, event, func, insert, inspect, literal, select
+from sqlalchemy.orm import Session
+
+from core.models import Category, MonthlyAggregate, Transaction
+from core.periods import get_period_range, period_of
+from core.schemas import CategoryType
+
+# Chave em `session.info` com os (usuário, período) a recalcular no próximo flush
+DIRTY_PERIODS_KEY = "aggregate_periods"
+# Colunas da transação que alteram os totais
+TRACKED_COLUMNS = ("user_id", "category_id", "card_id", "value", "paid_at")
+
+
+def period_bounds(period: date):
+    """Intervalo [início, fim) de `paid_at` do mês nominal `period`."""
+    start, end = get_period_range(period.year, period.month)
+    return datetime.combine(start, time.min), datetime.combine(end + timedelta(days=1), time.min)
+
+
+def mark_period(session, user_id, paid_at):
+    """Agenda o recálculo do período de `paid_at` no próximo flush da sessão."""
+    if user_id is None or paid_at is None:
+        return
+    session.info.setdefault(DIRTY_PERIODS_KEY, set()).add((user_id, period_of(paid_at)))
+
+
+def _column_values(obj, column: str):
+    """Valores atual e anterior (se alterado) de uma coluna da transação."""
+    history = inspect(obj).attrs[column].history
+    values = [*history.added, *history.unchanged, *history.deleted]
+    return values or [getattr(obj, column)]
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_dirty_periods(session, flush_context, instances):
+    for obj in (*session.new, *session.deleted):
+        if isinstance(obj, Transaction):
+            mark_period(session, obj.user_id, obj.paid_at)
+    for obj in session.dirty:
+        if not isinstance(obj, Transaction):
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[column].history.has_changes() for column in TRACKED_COLUMNS):
+            continue
+        for user_id in _column_values(obj, "user_id"):
+            for paid_at in _column_values(obj, "paid_at"):
+                mark_period(session, user_id, paid_at)
+
+
+@event.listens_for(Session, "after_flush")
+def _refresh_dirty_periods(session, flush_context):
+    periods = session.info.pop(DIRTY_PERIODS_KEY, None)
+    if periods:
+        refresh_periods(session.connection(), periods)
+
+
+@event.listens_for(Session, "before_commit")
+def _refresh_pending_periods(session):
+    # Períodos marcados fora de um flush (inserções em massa de core.series)
+    periods = session.info.pop(DIRTY_PERIODS_KEY, None)
+    if periods:
+        refresh_periods(session.connection(), periods)
+
+
+def refresh_periods(connection, periods):
+    """Recalcula os agregados dos (usuário, período) informados na transação corrente.
+
+    É um recálculo do período inteiro, não a aplicação de deltas: cada (usuário, período)
+    tocado num flush ou commit custa um advisory lock (mantido até o commit, serializando
+    escritas concorrentes do mesmo usuário no mês), um DELETE das suas linhas e um
+    INSERT ... SELECT com GROUP BY sobre os pagamentos do usuário no mês, pelo índice
+    `ix_transactions_user_paid_at`. O custo cresce com as transações pagas do usuário naquele
+    mês, não com a tabela; em troca, as escritas em massa de core.series, que não passam pelo
+    flush e não têm as linhas anteriores à mão, ficam corretas só marcando o período.
+    """
+    for user_id, period in sorted(periods):
+        if connection.dialect.name == "postgresql":
+            # Serializa recálculos concorrentes do mesmo usuário/período
+            lock_key = period.year * 100 + period.month
+            connection.execute(select(func.pg_advisory_xact_lock(user_id, lock_key)))
+        connection.execute(
+            delete(MonthlyAggregate).where(
+                MonthlyAggregate.user_id == user_id, MonthlyAggregate.period == period
+            )
+        )
+        start, end = period_bounds(period)
+        totals = (
+            select(
+                Transaction.user_id,
+                literal(period, Date),
+                Transaction.category_id,
+                Transaction.card_id,
+                func.sum(Transaction.value),
+                func.count(),
+            )
+            .where(
+                Transaction.user_id == user_id,
+                Transaction.paid_at >= start,
+                Transaction.paid_at < end,
+            )
+            .group_by(Transaction.user_id, Transaction.category_id, Transaction.card_id)
+        )
+        connection.execute(
+            insert(MonthlyAggregate).from_select(
+                ["user_id", "period", "category_id", "card_id", "total", "count"], totals
+            )
+        )
+
+
+def add_aggregates_schema(db) -> bool:
+    """Cria a tabela `monthly_aggregates` em bancos antigos. Retorna se ela foi criada.
+
+    Precisa rodar antes do deploy (`manage.py migrate`): os eventos de flush acima gravam na
+    tabela a cada escrita de transação.
+    """
+    bind = db.connection()
+    exists = inspect(bind).has_table(MonthlyAggregate.__tablename__)
+    if not exists:
+        MonthlyAggregate.__table__.create(bind)
+    db.commit()
+    return not exists
+
+
+def rebuild_aggregates(db, user_id: int = None) -> int:
+    """Reconstrói do zero os agregados de um usuário (ou de todos). Retorna os períodos."""
+    paid_days = (
+        select(Transaction.user_id, cast(Transaction.paid_at, Date))
+        .where(Transaction.paid_at.isnot(None))
+        .distinct()
+    )
+    clear = delete(MonthlyAggregate)
+    if user_id is not None:
+        paid_days = paid_days.where(Transaction.user_id == user_id)
+        clear = clear.where(MonthlyAggregate.user_id == user_id)
+    periods = {(uid, period_of(day)) for uid, day in db.execute(paid_days)}
+    db.execute(clear)
+    refresh_periods(db.connection(), periods)
+    db.commit()
+    return len(periods)
+
+
+def period_totals(user_id: int, period: date):
+    """Totais pagos do período por categoria, tipo e conta/cartão (sem faturas e transferências)."""
+    on_card = MonthlyAggregate.card_id.isnot(None)
+    return (
+        select(
+            MonthlyAggregate.category_id,
+            Category.type,
+            on_card.label("on_card"),
+            func.sum(MonthlyAggregate.total).label("total"),
+        )
+        .join(Category, MonthlyAggregate.category_id == Category.id)
+        .where(MonthlyAggregate.user_id == user_id, MonthlyAggregate.period == period)
+        .where(Category.type.not_in([CategoryType.invoice, CategoryType.transfer]))
+        .group_by(MonthlyAggregate.category_id, Category.type, on_card)
+    )
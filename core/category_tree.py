@@ -0,0 +1,98 @@
+from sqlalchemy import String, cast, event, func, inspect, literal, or_, select, text, update
+from sqlalchemy.orm import Session, aliased
+
+from core.models import Category
+
+# Chave em `session.info` com os usuários cuja árvore de categorias mudou
+DIRTY_TREES_KEY = "category_trees"
+# Colunas da categoria que alteram caminho, rótulo ou raiz
+TRACKED_COLUMNS = ("parent_id", "name")
+# Colunas materializadas da hierarquia (adicionadas por `manage.py migrate`)
+TREE_COLUMNS = {"path": "VARCHAR(255)", "full_name": "VARCHAR(255)", "root_id": "INTEGER"}
+
+
+def tree_update(user_id: int = None):
+    """UPDATE que recalcula caminho, rótulo completo e raiz via CTE recursiva."""
+    roots = select(
+        Category.id.label("id"),
+        Category.id.label("root_id"),
+        (literal("/") + cast(Category.id, String) + "/").label("path"),
+        func.trim(Category.name).label("full_name"),
+    ).where(Category.parent_id.is_(None))
+    if user_id is not None:
+        roots = roots.where(Category.user_id == user_id)
+    tree = roots.cte("category_tree", recursive=True)
+    child = aliased(Category)
+    tree = tree.union_all(
+        select(
+            child.id,
+            tree.c.root_id,
+            tree.c.path + cast(child.id, String) + "/",
+            tree.c.full_name + " > " + func.trim(child.name),
+        ).join(tree, child.parent_id == tree.c.id)
+    )
+    return (
+        update(Category)
+        .where(Category.id == tree.c.id)
+        .where(
+            or_(
+                Category.root_id.is_distinct_from(tree.c.root_id),
+                Category.path.is_distinct_from(tree.c.path),
+                Category.full_name.is_distinct_from(tree.c.full_name),
+            )
+        )
+        # Mantém updated_at: a hierarquia é derivada, não uma edição da categoria
+        .values(
+            root_id=tree.c.root_id,
+            path=tree.c.path,
+            full_name=tree.c.full_name,
+            updated_at=Category.updated_at,
+        )
+    )
+
+
+def mark_tree(session, user_id):
+    """Agenda o recálculo da árvore de categorias do usuário no próximo flush."""
+    if user_id is not None:
+        session.info.setdefault(DIRTY_TREES_KEY, set()).add(user_id)
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_dirty_trees(session, flush_context, instances):
+    for obj in session.new:
+        if isinstance(obj, Category):
+            mark_tree(session, obj.user_id)
+    for obj in session.dirty:
+        if not isinstance(obj, Category):
+            continue
+        state = inspect(obj)
+        if any(state.attrs[column].history.has_changes() for column in TRACKED_COLUMNS):
+            mark_tree(session, obj.user_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _refresh_dirty_trees(session, flush_context):
+    user_ids = session.info.pop(DIRTY_TREES_KEY, None)
+    for user_id in sorted(user_ids or ()):
+        session.connection().execute(tree_update(user_id))
+
+
+def add_category_tree_schema(db):
+    """Cria as colunas da hierarquia em bancos antigos (sem preencher; ver abaixo)."""
+    if db.get_bind().dialect.name == "postgresql":
+        for column, column_type in TREE_COLUMNS.items():
+            db.execute(
+                text(f"ALTER TABLE categories ADD COLUMN IF NOT EXISTS {column} {column_type}")
+            )
+    db.commit()
+
+
+def rebuild_category_tree(db) -> int:
+    """Cria as colunas da hierarquia se faltarem e recalcula todas as árvores.
+
+    Só altera as categorias cujos valores mudaram, então pode rodar a cada deploy.
+    """
+    add_category_tree_schema(db)
+    updated = db.execute(tree_update()).rowcount
+    db.commit()
+    return updated
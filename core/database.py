@@ -1,18 +1,253 @@
-from sqlalchemy import create_engine
+import threading
+import time
+
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from core.settings import DATABASE_URL
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from core.settings import (
+    ASYNC_DATABASE_REPLICA_URL,
+    ASYNC_DATABASE_URL,
+    DATABASE_REPLICA_URL,
+    DATABASE_URL,
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_STATEMENT_TIMEOUT_MS,
+    READ_YOUR_WRITES_SECONDS,
+)
+
+# Cookie que mantém as leituras do navegador no primário logo após uma escrita
+PRIMARY_PIN_COOKIE = "db_primary_until"
+READ_ONLY_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class PoolMetrics:
+    """Contadores do pool de conexões de um engine (checkouts, espera, overflow, invalidações)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = None
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def incr(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self) -> dict:
+        """Retorna o estado atual do pool e os contadores acumulados."""
+        with self._lock:
+            checkouts = self.checkouts
+            data = {
+                "name": self.name,
+                "connects": self.connects,
+                "checkouts": checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "checkout_wait_total_ms": round(self.wait_total * 1000, 3),
+                "checkout_wait_avg_ms": (
+                    round(self.wait_total / checkouts * 1000, 3) if checkouts else 0.0
+                ),
+                "checkout_wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+        pool = self.pool
+        if isinstance(pool, QueuePool):
+            data.update(
+                {
+                    "pool_size": pool.size(),
+                    "checked_in": pool.checkedin(),
+                    "checked_out": pool.checkedout(),
+                    "overflow_in_use": max(pool.overflow(), 0),
+                    "max_overflow": pool._max_overflow,
+                }
+            )
+        return data
+
+
+def metered_pool_class(metrics: PoolMetrics, base=QueuePool):
+    """Cria uma subclasse do pool que mede o tempo de espera de cada checkout."""
+
+    class MeteredPool(base):
+        def connect(self):
+            started = time.perf_counter()
+            try:
+                connection = super().connect()
+            except PoolTimeoutError:
+                metrics.record_wait(time.perf_counter() - started, timed_out=True)
+                raise
+            metrics.record_wait(time.perf_counter() - started)
+            return connection
+
+    return MeteredPool
+
+
+def instrument_engine(engine, metrics: PoolMetrics):
+    """Registra os eventos do pool do engine nos contadores de `metrics`."""
+    metrics.pool = engine.pool
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        metrics.incr("connects")
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.incr("checkouts")
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        metrics.incr("checkins")
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.incr("invalidations")
+
+    @event.listens_for(engine, "soft_invalidate")
+    def _on_soft_invalidate(dbapi_connection, connection_record, exception):
+        metrics.incr("invalidations")
 
+    @event.listens_for(engine, "engine_disposed")
+    def _on_dispose(conn):
+        metrics.pool = engine.pool
 
 
-engine = create_engine(DATABASE_URL)
+def engine_options(url: str, metrics: PoolMetrics, is_async: bool = False) -> dict:
+    """Monta os parâmetros de pool do `create_engine` a partir das configurações."""
+    pool_base = AsyncAdaptedQueuePool if is_async else QueuePool
+    options = {
+        "poolclass": metered_pool_class(metrics, pool_base),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    url = make_url(url)
+    if DB_STATEMENT_TIMEOUT_MS and url.get_backend_name() == "postgresql":
+        if url.get_driver_name() == "asyncpg":
+            options["connect_args"] = {
+                "server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+            }
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+def async_database_url(url: str) -> str:
+    """Converte a URL síncrona (psycopg2) para o driver assíncrono equivalente."""
+    url = make_url(url)
+    if url.get_backend_name() == "postgresql":
+        url = url.set(drivername="postgresql+asyncpg")
+    return url.render_as_string(hide_password=False)
+
+
+pool_metrics = PoolMetrics("primary")
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL, pool_metrics))
+instrument_engine(engine, pool_metrics)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine assíncrono para as rotas `async def` (não ocupa uma thread do anyio durante o I/O)
+async_pool_metrics = PoolMetrics("primary-async")
+_async_url = ASYNC_DATABASE_URL or async_database_url(DATABASE_URL)
+async_engine = create_async_engine(
+    _async_url, **engine_options(_async_url, async_pool_metrics, is_async=True)
+)
+instrument_engine(async_engine.sync_engine, async_pool_metrics)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+# Réplica de leitura (opcional): sem DATABASE_REPLICA_URL tudo vai para o primário
+replica_pool_metrics = None
+async_replica_pool_metrics = None
+ReplicaSessionLocal = SessionLocal
+AsyncReplicaSessionLocal = AsyncSessionLocal
+if DATABASE_REPLICA_URL:
+    replica_pool_metrics = PoolMetrics("replica")
+    replica_engine = create_engine(
+        DATABASE_REPLICA_URL, **engine_options(DATABASE_REPLICA_URL, replica_pool_metrics)
+    )
+    instrument_engine(replica_engine, replica_pool_metrics)
+    ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
+    async_replica_pool_metrics = PoolMetrics("replica-async")
+    _async_replica_url = ASYNC_DATABASE_REPLICA_URL or async_database_url(DATABASE_REPLICA_URL)
+    async_replica_engine = create_async_engine(
+        _async_replica_url,
+        **engine_options(_async_replica_url, async_replica_pool_metrics, is_async=True),
+    )
+    instrument_engine(async_replica_engine.sync_engine, async_replica_pool_metrics)
+    AsyncReplicaSessionLocal = async_sessionmaker(
+        bind=async_replica_engine, autoflush=False, expire_on_commit=False
+    )
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+
+def get_pool_metrics() -> list[dict]:
+    """Retorna as métricas de todos os pools de conexão da aplicação."""
+    metrics = [pool_metrics, async_pool_metrics, replica_pool_metrics, async_replica_pool_metrics]
+    return [m.snapshot() for m in metrics if m is not None]
+
+
+def use_replica(request: Request | None) -> bool:
+    """Indica se a requisição pode ser atendida pela réplica de leitura.
+
+    Só requisições de leitura vão para a réplica, e apenas se o navegador não tiver
+    feito uma escrita dentro da janela de read-your-writes.
+    """
+    if not DATABASE_REPLICA_URL or request is None:
+        return False
+    if request.method not in READ_ONLY_METHODS:
+        return False
+    try:
+        pinned_until = float(request.cookies.get(PRIMARY_PIN_COOKIE, 0))
+    except ValueError:
+        pinned_until = 0
+    return pinned_until < time.time()
+
+
+def pin_to_primary(response):
+    """Marca o navegador para ler do primário durante a janela de read-your-writes."""
+    if not DATABASE_REPLICA_URL or READ_YOUR_WRITES_SECONDS <= 0:
+        return
+    response.set_cookie(
+        key=PRIMARY_PIN_COOKIE,
+        value=str(time.time() + READ_YOUR_WRITES_SECONDS),
+        max_age=READ_YOUR_WRITES_SECONDS,
+        httponly=True,
+        samesite="Lax",
+    )
+
+
+def get_db(request: Request = None):
+    db = ReplicaSessionLocal() if use_replica(request) else SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db(request: Request = None):
+    session_factory = AsyncReplicaSessionLocal if use_replica(request) else AsyncSessionLocal
+    async with session_factory() as db:
+        yield db
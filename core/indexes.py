@@ -0,0 +1,52 @@
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+
+import core.models  # noqa: F401 - registra as tabelas no metadata
+from core.database import Base, engine
+from core.settings import TRGM_SEARCH_ENABLED
+
+
+def iter_indexes():
+    """Percorre os índices declarados nos models, tabela por tabela."""
+    for table in Base.metadata.sorted_tables:
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            yield table, index
+
+
+def create_indexes(concurrently: bool = True):
+    """Cria os índices declarados nos models que ainda não existem no banco.
+
+    Com `concurrently`, usa CREATE INDEX CONCURRENTLY (Postgres) para não bloquear escritas
+    em tabelas grandes. Índices inválidos deixados por uma criação concorrente interrompida
+    são removidos e recriados.
+    """
+    is_postgres = engine.dialect.name == "postgresql"
+    concurrently = concurrently and is_postgres
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if is_postgres and TRGM_SEARCH_ENABLED:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for table, index in iter_indexes():
+            if not conn.dialect.has_table(conn, table.name):
+                continue
+            if is_postgres:
+                valid = conn.execute(
+                    text(
+                        "SELECT i.indisvalid FROM pg_index i"
+                        " JOIN pg_class c ON c.oid = i.indexrelid"
+                        " WHERE c.relname = :name"
+                    ),
+                    {"name": index.name},
+                ).scalar()
+                if valid:
+                    continue
+                if valid is False:
+                    print(f"Recriando índice inválido: {index.name}")
+                    drop = "DROP INDEX CONCURRENTLY" if concurrently else "DROP INDEX"
+                    conn.execute(text(f'{drop} IF EXISTS "{index.name}"'))
+
+            index.dialect_options["postgresql"]["concurrently"] = concurrently
+            try:
+                print(f"Criando índice: {index.name}")
+                conn.execute(CreateIndex(index, if_not_exists=True))
+            finally:
+                index.dialect_options["postgresql"]["concurrently"] = False
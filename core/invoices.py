@@ -0,0 +1,73 @@
+from sqlalchemy import Date, DateTime, Integer, case, cast, extract, func, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from core.models import Card, Category, Transaction
+from core.schemas import CategoryType
+
+
+def billing_cycle(due_at, close_day):
+    """Primeiro dia do mês da fatura; a partir do dia de fechamento vai para a seguinte."""
+    month_start = func.date_trunc("month", cast(due_at, DateTime))
+    next_month = case((extract("day", due_at) >= close_day, 1), else_=0)
+    return month_start + func.make_interval(0, next_month)
+
+
+def day_of_cycle(cycle, day):
+    """Data do dia `day` no mês do ciclo, limitado ao último dia do mês."""
+    last_day = cast(
+        extract("day", cycle + func.make_interval(0, 1) - func.make_interval(0, 0, 0, 1)), Integer
+    )
+    return cast(cycle + func.make_interval(0, 0, 0, func.least(day, last_day) - 1), Date)
+
+
+def invoice_groups(*conditions, entity=Transaction):
+    """Faturas de cartão agrupadas no banco: uma linha por (cartão, ciclo, paga ou não).
+
+    Cada linha traz o cartão, o vencimento e o fechamento da fatura, o total (despesas menos
+    créditos), a data de pagamento e os ids das transações em ordem de vencimento.
+    `conditions` filtra as transações consideradas (usuário, período, situação); `entity`
+    permite agrupar sobre `core.occurrences.transactions_view`.
+    """
+    cycle = billing_cycle(entity.due_at, Card.close_day)
+    members = (
+        select(
+            entity.id,
+            entity.card_id,
+            Card.name.label("card_name"),
+            entity.due_at,
+            entity.paid_at,
+            entity.paid_at.isnot(None).label("is_paid"),
+            day_of_cycle(cycle, Card.due_day).label("invoice_due_at"),
+            day_of_cycle(cycle, Card.close_day).label("invoice_close_at"),
+            case(
+                (Category.type == CategoryType.expense, entity.value),
+                else_=-entity.value,
+            ).label("signed_value"),
+        )
+        .join(Card, entity.card_id == Card.id)
+        .join(Category, entity.category_id == Category.id)
+        .where(*conditions)
+        .subquery()
+    )
+    return (
+        select(
+            members.c.card_id,
+            members.c.card_name,
+            members.c.invoice_due_at.label("due_at"),
+            members.c.invoice_close_at.label("close_at"),
+            members.c.is_paid,
+            func.sum(members.c.signed_value).label("total"),
+            func.max(members.c.paid_at).label("paid_at"),
+            func.array_agg(
+                aggregate_order_by(members.c.id, members.c.due_at, members.c.id)
+            ).label("transaction_ids"),
+        )
+        .group_by(
+            members.c.card_id,
+            members.c.card_name,
+            members.c.invoice_due_at,
+            members.c.invoice_close_at,
+            members.c.is_paid,
+        )
+        .order_by(members.c.invoice_due_at, members.c.card_id, members.c.is_paid)
+    )
@@ -0,0 +1,138 @@
+from sqlalchemy import func, select
+
+from core.pagination import decode_cursor, encode_cursor, keyset_condition, keyset_order
+from core.search import text_search_filter
+
+
+class ListQuery:
+    """Consulta paginada dos datagrids.
+
+    Recebe o select base da entidade e um mapa de chaves de ordenação permitidas. Aplica
+    filtros tipados e devolve a página junto com o total em uma única consulta
+    (`count(*) OVER ()`), ou a página seguinte a um cursor (keyset) quando informado.
+    """
+
+    def __init__(self, statement, id_column, sort_map: dict, default_sort: str = "id"):
+        self.statement = statement
+        self.id_column = id_column
+        self.sort_map = sort_map
+        self.default_sort = default_sort
+        self.sort_by = default_sort
+        self.sort_order = "asc"
+        self.pre_order = []
+
+    # Filtros -------------------------------------------------------------------------------
+
+    def where(self, *clauses):
+        self.statement = self.statement.where(*clauses)
+        return self
+
+    def filter_equals(self, column, value, cast=None):
+        """Filtra por igualdade, convertendo o valor com `cast`. Valores vazios são ignorados.
+
+        Levanta ValueError se o valor não puder ser convertido.
+        """
+        if value is None or value == "":
+            return self
+        return self.where(column == (cast(value) if cast else value))
+
+    def filter_contains(self, column, value: str):
+        """Filtra por trecho de texto (ILIKE, atendido pelo índice trigram no Postgres)."""
+        if not value:
+            return self
+        return self.where(text_search_filter(column, value))
+
+    def filter_range(self, column, start=None, end=None, cast=None):
+        """Filtra `start <= coluna <= end`, convertendo os limites com `cast`."""
+        if start:
+            self.where(column >= (cast(start) if cast else start))
+        if end:
+            self.where(column <= (cast(end) if cast else end))
+        return self
+
+    # Ordenação -----------------------------------------------------------------------------
+
+    def order(self, sort_by: str, sort_order: str):
+        """Ordena por uma chave do `sort_map`; chaves desconhecidas usam a padrão."""
+        self.sort_by = sort_by if sort_by in self.sort_map else self.default_sort
+        self.sort_order = "desc" if sort_order.lower() == "desc" else "asc"
+        return self
+
+    def order_first_by(self, *clauses):
+        """Critérios aplicados antes da chave de ordenação (desativa a paginação por cursor)."""
+        self.pre_order.extend(clauses)
+        return self
+
+    @property
+    def sort_column(self):
+        return self.sort_map[self.sort_by]
+
+    @property
+    def supports_cursor(self) -> bool:
+        return not self.pre_order
+
+    def ordered_statement(self):
+        descending = self.sort_order == "desc"
+        return self.statement.order_by(
+            *self.pre_order, *keyset_order(self.sort_column, self.id_column, descending)
+        )
+
+    # Execução ------------------------------------------------------------------------------
+
+    def count_statement(self):
+        return select(func.count()).select_from(self.statement.order_by(None).subquery())
+
+    def page_statement(self, page: int, per_page: int, cursor: str = None):
+        """Select da página: entidade, valor de ordenação e o total via função de janela.
+
+        Com um cursor válido o total não é calculado (None) e a página parte da última linha
+        vista. Busca uma linha a mais para saber se existe página seguinte.
+        """
+        statement = self.ordered_statement().add_columns(self.sort_column.label("sort_value"))
+        keyset = None
+        if cursor and self.supports_cursor:
+            keyset = decode_cursor(cursor, self.sort_by, self.sort_order, self.sort_column)
+        if keyset:
+            last_value, last_id = keyset
+            statement = statement.where(
+                keyset_condition(
+                    self.sort_column,
+                    self.id_column,
+                    last_value,
+                    last_id,
+                    self.sort_order == "desc",
+                )
+            )
+            return statement.limit(per_page + 1), True
+        statement = statement.add_columns(func.count().over().label("total_count"))
+        return statement.offset((max(page, 1) - 1) * per_page).limit(per_page + 1), False
+
+    def _result(self, rows, per_page: int, by_cursor: bool):
+        next_cursor = None
+        if len(rows) > per_page:
+            rows = rows[:per_page]
+            if self.supports_cursor:
+                last = rows[-1]
+                next_cursor = encode_cursor(
+                    self.sort_by, self.sort_order, last.sort_value, last[0].id
+                )
+        total = None if by_cursor else (rows[0][-1] if rows else None)
+        return [row[0] for row in rows], total, next_cursor
+
+    def fetch(self, db, page: int, per_page: int, cursor: str = None):
+        """Executa em uma Session síncrona. Retorna (itens, total, próximo cursor)."""
+        statement, by_cursor = self.page_statement(page, per_page, cursor)
+        items, total, next_cursor = self._result(db.execute(statement).all(), per_page, by_cursor)
+        if total is None and not by_cursor:
+            # Página além do fim: a janela não retornou linhas para informar o total
+            total = db.scalar(self.count_statement()) if page > 1 else 0
+        return items, total, next_cursor
+
+    async def afetch(self, db, page: int, per_page: int, cursor: str = None):
+        """Executa em uma AsyncSession. Retorna (itens, total, próximo cursor)."""
+        statement, by_cursor = self.page_statement(page, per_page, cursor)
+        rows = (await db.execute(statement)).all()
+        items, total, next_cursor = self._result(rows, per_page, by_cursor)
+        if total is None and not by_cursor:
+            total = await db.scalar(self.count_statement()) if page > 1 else 0
+        return items, total, next_cursor
@@ -0,0 +1,47 @@
+from sqlalchemy.orm import contains_eager, joinedload, raiseload, selectinload
+
+from core.models import Category, Transaction
+from core.settings import DB_STRICT_LOADING
+
+
+def strict(*options):
+    """Opções do perfil; com DB_STRICT_LOADING, qualquer lazy load com SQL levanta erro."""
+    if DB_STRICT_LOADING:
+        return (*options, raiseload("*", sql_only=True))
+    return options
+
+
+def transaction_grid(entity=Transaction):
+    """Datagrid de /transactions: o select já faz join de Account, Category e Card."""
+    return strict(
+        contains_eager(entity.account),
+        contains_eager(entity.category),
+        contains_eager(entity.card),
+    )
+
+
+def transaction_index(entity=Transaction):
+    """Itens do dashboard: o select já faz join de Category.
+
+    `entity` pode ser a visão com ocorrências virtuais de `core.occurrences`.
+    """
+    return strict(contains_eager(entity.category))
+
+
+def transaction_payment():
+    """Pagamento de fatura: tipo da categoria de cada transação."""
+    return strict(joinedload(Transaction.category))
+
+
+def category_detail():
+    """Detalhe da categoria: subcategorias e transações com conta e cartão.
+
+    A categoria de cada transação já está no identity map (a própria ou a subcategoria).
+    """
+    transaction_relations = (joinedload(Transaction.account), joinedload(Transaction.card))
+    return strict(
+        selectinload(Category.transactions).options(*transaction_relations),
+        selectinload(Category.subcategories)
+        .selectinload(Category.transactions)
+        .options(*transaction_relations),
+    )
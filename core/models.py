@@ -1,9 +1,26 @@
-from sqlalchemy import DECIMAL, Boolean, Column, Date, DateTime, Enum, ForeignKey, Integer, String
+from sqlalchemy import (
+    DECIMAL,
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Index,
+    JSON,
+    Integer,
+    String,
+    event,
+    text,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import relationship
+from sqlalchemy.schema import DDL
 from sqlalchemy.sql import func
 
 from core.database import Base
 from core.schemas import BankName, BrandName, CategoryType
+from core.settings import TRGM_SEARCH_ENABLED
 
 
 # 🔹 Usuário
@@ -15,6 +32,8 @@ class User(Base):
     email = Column(String(255), unique=True)
     username = Column(String(50), unique=True)
     password = Column(String(255))
+    # Incrementar invalida os tokens de sessão já emitidos (ver core.tokens)
+    token_version = Column(Integer, nullable=False, default=1, server_default="1")
     created_at = Column(DateTime(timezone=True), default=func.now())
     updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
 
@@ -29,6 +48,7 @@ class User(Base):
 # 🔹 Contas Bancárias
 class Account(Base):
     __tablename__ = "accounts"
+    __table_args__ = (Index("ix_accounts_user_id", "user_id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -49,6 +69,7 @@ class Account(Base):
 # 🔹 Cartões de Crédito
 class Card(Base):
     __tablename__ = "cards"
+    __table_args__ = (Index("ix_cards_user_id", "user_id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -70,6 +91,11 @@ class Card(Base):
 # 🔹 Categorias de Transações
 class Category(Base):
     __tablename__ = "categories"
+    __table_args__ = (
+        Index("ix_categories_user_parent", "user_id", "parent_id"),
+        Index("ix_categories_parent_id", "parent_id"),
+        Index("ix_categories_root_id", "root_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -78,6 +104,11 @@ class Category(Base):
     icon = Column(String(50), nullable=True)
     color = Column(String(7), nullable=True)
     parent_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
+    # Hierarquia materializada (mantida por core.category_tree): caminho de ids "/1/5/",
+    # rótulo completo "Pai > Filho" e categoria raiz
+    path = Column(String(255), nullable=True)
+    full_name = Column(String(255), nullable=True)
+    root_id = Column(Integer, nullable=True)
     system_category = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), default=func.now())
     updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
@@ -93,9 +124,21 @@ class Category(Base):
     budgets = relationship("Budget", back_populates="category", cascade="all, delete-orphan")
 
 
+FrequencyType = Enum(
+    "semanal",
+    "mensal",
+    "bimestral",
+    "trimestral",
+    "semestral",
+    "anual",
+    name="frequency_type",
+)
+
+
 # 🔹 Orçamentos
 class Budget(Base):
     __tablename__ = "budgets"
+    __table_args__ = (Index("ix_budgets_user_month", "user_id", "month"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -113,6 +156,37 @@ class Budget(Base):
 # 🔹 Transações
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # Dashboard: pagas no período e pendentes por vencimento
+        Index("ix_transactions_user_paid_at", "user_id", "paid_at"),
+        Index(
+            "ix_transactions_user_due_at_pending",
+            "user_id",
+            "due_at",
+            postgresql_where=text("paid_at IS NULL"),
+        ),
+        # Listagem/filtros de /transactions e faturas por cartão
+        Index("ix_transactions_user_due_at", "user_id", "due_at"),
+        Index("ix_transactions_user_card_due_at", "user_id", "card_id", "due_at"),
+        Index("ix_transactions_user_category", "user_id", "category_id"),
+        # Encadeamento de recorrências/parcelas
+        Index("ix_transactions_parent_id", "parent_id"),
+        Index("ix_transactions_series_id", "series_id", "id"),
+        # Exceções de recorrências virtuais: no máximo uma linha por posição da série
+        Index("ux_transactions_series_index", "series_id", "series_index", unique=True),
+    ) + (
+        # Busca por trecho da descrição (ILIKE '%...%') via pg_trgm
+        (
+            Index(
+                "ix_transactions_description_trgm",
+                "description",
+                postgresql_using="gin",
+                postgresql_ops={"description": "gin_trgm_ops"},
+            ),
+        )
+        if TRGM_SEARCH_ENABLED
+        else ()
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -120,6 +194,12 @@ class Transaction(Base):
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
     card_id = Column(Integer, ForeignKey("cards.id"), nullable=True)
     parent_id = Column(Integer, ForeignKey("transactions.id"), nullable=True)
+    # Série (recorrência ou parcelamento) a que a ocorrência pertence
+    series_id = Column(
+        Integer, ForeignKey("transaction_series.id", ondelete="SET NULL"), nullable=True
+    )
+    # Posição na série virtual (0 = primeira ocorrência); nula nas séries materializadas
+    series_index = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), default=func.now())
     updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
 
@@ -129,18 +209,7 @@ class Transaction(Base):
     paid_at = Column(DateTime, nullable=True)
 
     is_recurring = Column(Boolean, default=False)
-    recurring_frequency = Column(
-        Enum(
-            "semanal",
-            "mensal",
-            "bimestral",
-            "trimestral",
-            "semestral",
-            "anual",
-            name="frequency_type",
-        ),
-        nullable=True,
-    )
+    recurring_frequency = Column(FrequencyType, nullable=True)
     recurring_end_date = Column(Date, nullable=True)
     installments = Column(Integer, nullable=True)
     current_installment = Column(Integer, nullable=True)
@@ -150,7 +219,74 @@ class Transaction(Base):
     account = relationship("Account", back_populates="transactions")
     category = relationship("Category", back_populates="transactions")
     card = relationship("Card", back_populates="transactions")
+    series = relationship("TransactionSeries", back_populates="transactions")
     parent = relationship("Transaction", remote_side=[id], back_populates="linked_transactions")
     linked_transactions = relationship(
         "Transaction", back_populates="parent", cascade="all, delete-orphan"
     )
+
+
+# 🔹 Totais pagos por mês nominal (mantidos pelos eventos de flush em core.aggregates)
+class MonthlyAggregate(Base):
+    __tablename__ = "monthly_aggregates"
+    __table_args__ = (Index("ix_monthly_aggregates_user_period", "user_id", "period"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # Primeiro dia do mês nominal
+    period = Column(Date, nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), nullable=False)
+    # Nulo para transações da conta (sem cartão)
+    card_id = Column(Integer, ForeignKey("cards.id", ondelete="CASCADE"), nullable=True)
+    total = Column(DECIMAL(15, 2), nullable=False)
+    count = Column(Integer, nullable=False)
+
+
+# 🔹 Séries de transações (recorrências e parcelamentos)
+class TransactionSeries(Base):
+    __tablename__ = "transaction_series"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # Regra: frequência e data final (recorrência) ou quantidade de parcelas (parcelamento)
+    frequency = Column(FrequencyType, nullable=True)
+    end_date = Column(Date, nullable=True)
+    total_installments = Column(Integer, nullable=True)
+    # Último vencimento já gerado de uma recorrência materializada: core.rollover estende a
+    # partir daqui, então excluir ocorrências do fim não as faz voltar
+    generated_until = Column(Date, nullable=True)
+    # Descrição sem o prefixo "(atual/total) " das parcelas
+    description = Column(String, nullable=True)
+    # Recorrência virtual (ver core.occurrences): só a regra e as exceções ficam no banco;
+    # as demais ocorrências são geradas na consulta a partir dos campos abaixo
+    virtual = Column(Boolean, nullable=False, default=False, server_default="false")
+    start_date = Column(Date, nullable=True)
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), nullable=True)
+    card_id = Column(Integer, ForeignKey("cards.id", ondelete="CASCADE"), nullable=True)
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), nullable=True)
+    value = Column(DECIMAL(15, 2), nullable=True)
+    # Posições excluídas individualmente
+    skipped = Column(ARRAY(Integer), nullable=False, default=list, server_default="{}")
+    created_at = Column(DateTime(timezone=True), default=func.now())
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
+
+    transactions = relationship("Transaction", back_populates="series")
+
+
+# 🔹 Sessões web (backend "database" de core.sessions)
+class WebSession(Base):
+    __tablename__ = "web_sessions"
+    __table_args__ = (Index("ix_web_sessions_expires_at", "expires_at"),)
+
+    # Identificador opaco enviado no cookie
+    id = Column(String(64), primary_key=True)
+    data = Column(JSON, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+
+if TRGM_SEARCH_ENABLED:
+    event.listen(
+        Transaction.__table__,
+        "before_create",
+        DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+    )
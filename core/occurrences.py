@@ -0,0 +1,243 @@
+from datetime import date, timedelta
+
+from sqlalchemy import (
+    BigInteger,
+    Date,
+    Integer,
+    case,
+    cast,
+    column,
+    exists,
+    extract,
+    func,
+    inspect,
+    literal,
+    null,
+    or_,
+    select,
+    true,
+    union_all,
+)
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql.util import ClauseAdapter
+
+from core.models import Transaction, TransactionSeries
+from core.periods import add_months
+from core.settings import RECURRING_VIRTUAL
+
+# Ids sintéticos das ocorrências virtuais: -(série * OCCURRENCE_ID_BASE + posição). Passam do
+# limite de `integer` a partir da série 21475, então o id da view é `bigint`
+OCCURRENCE_ID_BASE = 100000
+# Meses entre ocorrências de cada frequência ("semanal" anda de 7 em 7 dias)
+FREQUENCY_MONTHS = {"mensal": 1, "bimestral": 2, "trimestral": 3, "semestral": 6, "anual": 12}
+FREQUENCIES = ("semanal", *FREQUENCY_MONTHS)
+
+
+def occurrence_id(series_id: int, index: int) -> int:
+    return -(series_id * OCCURRENCE_ID_BASE + index)
+
+
+def split_occurrence_id(transaction_id: int):
+    """(série, posição) de um id de ocorrência virtual."""
+    return divmod(-transaction_id, OCCURRENCE_ID_BASE)
+
+
+def occurrence_date(start: date, frequency: str, index: int) -> date:
+    """Vencimento da ocorrência `index`, sempre contado a partir do início da série."""
+    if frequency == "semanal":
+        return start + timedelta(days=7 * index)
+    return add_months(start, FREQUENCY_MONTHS[frequency] * index)
+
+
+def next_occurrence_date(day: date, frequency: str) -> date:
+    """Vencimento seguinte a `day` (as séries materializadas avançam uma a uma)."""
+    return occurrence_date(day, frequency, 1)
+
+
+def _steps_until(day: date):
+    """Quantidade (aproximada para baixo) de passos da regra entre o início da série e `day`."""
+    series = TransactionSeries
+    months = (extract("year", literal(day, Date)) - extract("year", series.start_date)) * 12 + (
+        extract("month", literal(day, Date)) - extract("month", series.start_date)
+    )
+    step = case(*((series.frequency == f, m) for f, m in FREQUENCY_MONTHS.items()), else_=1)
+    return case(
+        (series.frequency == "semanal", cast(literal(day, Date) - series.start_date, Integer) // 7),
+        else_=cast(months, Integer) // step,
+    )
+
+
+def view_type(column):
+    """Tipo da coluna na view: o id é `bigint` para caber os ids sintéticos."""
+    return BigInteger() if column.name == "id" else column.type
+
+
+def virtual_occurrences(user_id: int, start: date | None, end: date):
+    """Ocorrências virtuais do usuário com vencimento em [start, end] (sem `start`, desde o
+    início de cada série), com as colunas de `transactions` na mesma ordem.
+
+    Gera as posições da regra de cada série virtual com `generate_series`, pulando as
+    excluídas (`skipped`) e as já gravadas como exceção (mesma série e posição).
+    """
+    series = TransactionSeries
+    # Faixa de posições que pode cair na janela (com folga de um passo em cada ponta)
+    first = 1 if start is None else func.greatest(1, _steps_until(start) - 1)
+    steps = (
+        func.generate_series(first, _steps_until(end) + 1)
+        .table_valued(column("n", Integer))
+        .render_derived(name="steps")
+        .lateral()
+    )
+    months = case(*((series.frequency == f, m) for f, m in FREQUENCY_MONTHS.items()), else_=0)
+    due_at = case(
+        (series.frequency == "semanal", series.start_date + 7 * steps.c.n),
+        else_=cast(series.start_date + func.make_interval(0, months * steps.c.n), Date),
+    )
+    expanded = (
+        select(series, steps.c.n, cast(due_at, Date).label("due_at"))
+        .join(steps, true())
+        .where(
+            series.user_id == user_id,
+            series.virtual.is_(True),
+            series.start_date.isnot(None),
+            func.array_position(series.skipped, steps.c.n).is_(None),
+            ~exists().where(
+                Transaction.series_id == series.id, Transaction.series_index == steps.c.n
+            ),
+        )
+        .subquery("expanded")
+    )
+    values = {
+        "id": -(cast(expanded.c.id, BigInteger) * OCCURRENCE_ID_BASE + expanded.c.n),
+        "user_id": expanded.c.user_id,
+        "account_id": expanded.c.account_id,
+        "category_id": expanded.c.category_id,
+        "card_id": expanded.c.card_id,
+        "series_id": expanded.c.id,
+        "series_index": expanded.c.n,
+        "created_at": expanded.c.created_at,
+        "updated_at": expanded.c.updated_at,
+        "description": expanded.c.description,
+        "value": expanded.c.value,
+        "due_at": expanded.c.due_at,
+        "is_recurring": true(),
+        "recurring_frequency": expanded.c.frequency,
+        "recurring_end_date": expanded.c.end_date,
+    }
+    table = Transaction.__table__
+    occurrences = select(
+        *(
+            cast(values.get(column.name, null()), view_type(column)).label(column.name)
+            for column in table.c
+        )
+    ).where(
+        expanded.c.due_at <= end,
+        or_(expanded.c.end_date.is_(None), expanded.c.due_at <= expanded.c.end_date),
+    )
+    if start is not None:
+        occurrences = occurrences.where(expanded.c.due_at >= start)
+    return occurrences
+
+
+def transactions_view(user_id: int, start: date | None, end: date):
+    """Entidade `Transaction` sobre as transações do usuário mais as ocorrências virtuais com
+    vencimento em [start, end]. Sem RECURRING_VIRTUAL devolve o próprio `Transaction`.
+
+    As ocorrências virtuais são carregadas como objetos somente leitura, com id negativo; para
+    alterá-las use `materialize_occurrence`.
+    """
+    if not RECURRING_VIRTUAL:
+        return Transaction
+    table = Transaction.__table__
+    # As ocorrências vêm primeiro: a união herda delas o tipo `bigint` do id, usado também
+    # nos parâmetros comparados com ele (keyset, filtros por id)
+    view = union_all(
+        virtual_occurrences(user_id, start, end),
+        select(table).where(table.c.user_id == user_id),
+    ).subquery("transactions_view")
+    return aliased(Transaction, view)
+
+
+def adapt(entity, clause):
+    """Reescreve uma expressão sobre `Transaction` para a entidade de `transactions_view`."""
+    if entity is Transaction:
+        return clause
+    return ClauseAdapter(inspect(entity).selectable).traverse(clause)
+
+
+def find_occurrence(db, user_id: int, transaction_id: int):
+    """Ocorrência de um id virtual: a exceção já gravada ou um objeto transiente (não
+    adicionado à sessão). None se o id não corresponde a uma ocorrência válida.
+    """
+    series_id, index = split_occurrence_id(transaction_id)
+    series = db.get(TransactionSeries, series_id)
+    if (
+        series is None
+        or series.user_id != user_id
+        or not series.virtual
+        or index < 1
+        or index in series.skipped
+    ):
+        return None
+    due_at = occurrence_date(series.start_date, series.frequency, index)
+    if series.end_date and due_at > series.end_date:
+        return None
+
+    materialized = db.scalar(
+        select(Transaction).where(
+            Transaction.series_id == series.id, Transaction.series_index == index
+        )
+    )
+    if materialized is not None:
+        return materialized
+    return Transaction(
+        user_id=series.user_id,
+        account_id=series.account_id,
+        card_id=series.card_id,
+        category_id=series.category_id,
+        description=series.description,
+        value=series.value,
+        due_at=due_at,
+        is_recurring=True,
+        recurring_frequency=series.frequency,
+        recurring_end_date=series.end_date,
+        series_id=series.id,
+        series_index=index,
+    )
+
+
+def materialize_occurrence(db, user_id: int, transaction_id: int):
+    """Grava a ocorrência virtual como exceção da série (para pagar, editar ou excluir)."""
+    occurrence = find_occurrence(db, user_id, transaction_id)
+    if occurrence is not None and occurrence.id is None:
+        db.add(occurrence)
+        db.flush()
+    return occurrence
+
+
+def get_user_transaction(db, user_id: int, transaction_id: int, materialize: bool = False):
+    """Transação do usuário pelo id; ids negativos são ocorrências virtuais."""
+    if transaction_id < 0:
+        if materialize:
+            return materialize_occurrence(db, user_id, transaction_id)
+        return find_occurrence(db, user_id, transaction_id)
+    return db.scalar(
+        select(Transaction).where(Transaction.id == transaction_id, Transaction.user_id == user_id)
+    )
+
+
+def skip_occurrence(db, transaction):
+    """Exclui a posição da transação da série virtual, para que não volte a ser gerada."""
+    if transaction.series_index is None:
+        return
+    series = db.get(TransactionSeries, transaction.series_id)
+    if series is not None and transaction.series_index not in series.skipped:
+        series.skipped = [*series.skipped, transaction.series_index]
+
+
+def end_series(db, transaction, end_date: date):
+    """Encerra a série da transação em `end_date`: nem a expansão das virtuais nem a extensão
+    das materializadas (core.rollover) geram ocorrências depois disso."""
+    series = db.get(TransactionSeries, transaction.series_id) if transaction.series_id else None
+    if series is not None:
+        series.end_date = end_date
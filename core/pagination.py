@@ -0,0 +1,86 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import and_, or_
+
+
+def keyset_order(sort_column, id_column, descending: bool) -> list:
+    """Ordenação estável usada pela paginação por cursor: coluna de ordenação + id.
+
+    Os NULLs ficam no fim em ordem crescente e no início em ordem decrescente (o padrão
+    do Postgres), explicitado para que o predicado de `keyset_condition` seja o mesmo em
+    qualquer banco.
+    """
+    if descending:
+        return [sort_column.desc().nulls_first(), id_column.desc()]
+    return [sort_column.asc().nulls_last(), id_column.asc()]
+
+
+def keyset_condition(sort_column, id_column, last_value, last_id: int, descending: bool):
+    """Predicado que seleciona as linhas depois de (last_value, last_id) em `keyset_order`."""
+    if descending:
+        if last_value is None:
+            return or_(
+                and_(sort_column.is_(None), id_column < last_id), sort_column.isnot(None)
+            )
+        return or_(
+            sort_column < last_value, and_(sort_column == last_value, id_column < last_id)
+        )
+    if last_value is None:
+        return and_(sort_column.is_(None), id_column > last_id)
+    return or_(
+        sort_column > last_value,
+        and_(sort_column == last_value, id_column > last_id),
+        sort_column.is_(None),
+    )
+
+
+def _dump_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, "value"):  # Enum
+        return value.value
+    return value
+
+
+def _load_value(value, sort_column):
+    if value is None:
+        return None
+    try:
+        python_type = sort_column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if python_type is Decimal:
+        return Decimal(value)
+    if python_type is int:
+        return int(value)
+    return value
+
+
+def encode_cursor(sort_by: str, sort_order: str, last_value, last_id: int) -> str:
+    """Gera o cursor opaco da próxima página a partir da última linha exibida."""
+    payload = {"s": sort_by, "o": sort_order, "v": _dump_value(last_value), "id": last_id}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, sort_order: str, sort_column):
+    """Lê o cursor e retorna (last_value, last_id).
+
+    Retorna None se o cursor for inválido ou tiver sido gerado para outra ordenação.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload["s"] != sort_by or payload["o"] != sort_order:
+            return None
+        return _load_value(payload["v"], sort_column), int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        return None
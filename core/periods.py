@@ -0,0 +1,64 @@
+import calendar
+from datetime import date
+
+# O "mês nominal" vai do dia FIRST_DAY_OF_MONTH do mês anterior ao dia LAST_DAY_OF_MONTH
+FIRST_DAY_OF_MONTH = 20
+LAST_DAY_OF_MONTH = 19
+
+
+def shift_month(year: int, month: int, delta: int):
+    new_month = month + delta
+    new_year = year
+    if new_month < 1:
+        new_month += 12
+        new_year -= 1
+    elif new_month > 12:
+        new_month -= 12
+        new_year += 1
+    return new_year, new_month
+
+
+def get_period_range(year: int, month: int):
+    if FIRST_DAY_OF_MONTH > LAST_DAY_OF_MONTH:
+        prev_year, prev_month = shift_month(year, month, -1)
+        _, last_day = calendar.monthrange(prev_year, prev_month)
+        start_date = date(
+            prev_year,
+            prev_month,
+            FIRST_DAY_OF_MONTH if FIRST_DAY_OF_MONTH <= last_day else last_day,
+        )
+    else:
+        _, last_day = calendar.monthrange(year, month)
+        start_date = date(
+            year, month, FIRST_DAY_OF_MONTH if FIRST_DAY_OF_MONTH <= last_day else last_day
+        )
+
+    _, last_day = calendar.monthrange(year, month)
+    end_date = date(year, month, LAST_DAY_OF_MONTH if LAST_DAY_OF_MONTH <= last_day else last_day)
+    return start_date, end_date
+
+
+def nominal_month(day: date):
+    """Retorna (ano, mês) do mês nominal ao qual o dia pertence."""
+    year, month = day.year, day.month
+    if FIRST_DAY_OF_MONTH > LAST_DAY_OF_MONTH and day.day >= FIRST_DAY_OF_MONTH:
+        year, month = shift_month(year, month, 1)
+    return year, month
+
+
+def period_of(day: date) -> date:
+    """Primeiro dia do mês nominal do dia, usado como chave de período."""
+    year, month = nominal_month(day)
+    return date(year, month, 1)
+
+
+def add_months(source_date, months):
+    month = source_date.month - 1 + months
+    year = source_date.year + (month // 12)
+    month = (month % 12) + 1
+    day = source_date.day
+    try:
+        return source_date.replace(year=year, month=month, day=day)
+    except ValueError:
+        last_day = calendar.monthrange(year, month)[1]
+        return source_date.replace(year=year, month=month, day=last_day)
@@ -0,0 +1,97 @@
+import contextvars
+import logging
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from core.settings import QUERY_STATS_SLOW_QUERY_COUNT
+
+logger = logging.getLogger("controle.db")
+
+_current_stats = contextvars.ContextVar("query_stats", default=None)
+
+
+class QueryStats:
+    """Estatísticas de SQL de uma requisição: quantidade, tempo total e statement mais lento."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = None
+
+    def record(self, statement: str, elapsed: float):
+        with self._lock:
+            self.count += 1
+            self.total += elapsed
+            if elapsed > self.slowest:
+                self.slowest = elapsed
+                self.slowest_statement = statement
+
+    def as_headers(self) -> dict:
+        return {
+            "X-DB-Query-Count": str(self.count),
+            "X-DB-Time-Ms": f"{self.total * 1000:.2f}",
+            "X-DB-Slowest-Ms": f"{self.slowest * 1000:.2f}",
+        }
+
+    def as_log_fields(self) -> dict:
+        return {
+            "db_query_count": self.count,
+            "db_time_ms": round(self.total * 1000, 2),
+            "db_slowest_ms": round(self.slowest * 1000, 2),
+            "db_slowest_statement": " ".join((self.slowest_statement or "").split())[:500],
+        }
+
+
+def start_request_stats():
+    """Inicia a coleta para a requisição atual. Retorna as estatísticas e o token do contexto."""
+    stats = QueryStats()
+    return stats, _current_stats.set(stats)
+
+
+def stop_request_stats(token):
+    _current_stats.reset(token)
+
+
+def log_request_stats(stats: QueryStats, method: str, route: str, status_code: int):
+    """Registra as estatísticas da requisição como campos estruturados, chaveadas pela rota."""
+    fields = {"method": method, "route": route, "status_code": status_code}
+    fields.update(stats.as_log_fields())
+    level = logging.INFO
+    if QUERY_STATS_SLOW_QUERY_COUNT and stats.count >= QUERY_STATS_SLOW_QUERY_COUNT:
+        level = logging.WARNING
+    logger.log(
+        level,
+        "%s %s queries=%d db_ms=%.2f slowest_ms=%.2f",
+        method,
+        route,
+        stats.count,
+        fields["db_time_ms"],
+        fields["db_slowest_ms"],
+        extra=fields,
+    )
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started_at"].pop()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # Descarta o início do statement que falhou para não desalinhar a pilha de tempos
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started_at"):
+        conn.info["query_started_at"].pop()
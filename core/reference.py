@@ -0,0 +1,86 @@
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core.cache import TTLCache
+from core.models import Account, Card, Category
+from core.schemas import ComboboxOption
+from core.settings import REFERENCE_CACHE_MAX_ENTRIES, REFERENCE_CACHE_TTL_SECONDS
+
+# Listas de referência (contas, cartões, categorias) por (usuário, tipo), como dicionários
+# simples: nunca objetos ORM, que pertencem à sessão de quem os carregou
+reference_cache = TTLCache("reference", REFERENCE_CACHE_MAX_ENTRIES, REFERENCE_CACHE_TTL_SECONDS)
+
+
+def _accounts(user_id: int):
+    return select(Account.id, Account.name, Account.bank).where(Account.user_id == user_id)
+
+
+def _cards(user_id: int):
+    return select(Card.id, Card.name, Card.account_id).where(Card.user_id == user_id)
+
+
+def _categories(user_id: int):
+    return select(
+        Category.id, Category.name, Category.full_name, Category.type, Category.parent_id
+    ).where(Category.user_id == user_id)
+
+
+REFERENCE_QUERIES = {"accounts": _accounts, "cards": _cards, "categories": _categories}
+
+
+def reference_data(db: Session, user_id: int, kind: str) -> list[dict]:
+    """Lista de referência do usuário (somente leitura), do cache ou do banco."""
+    rows = reference_cache.get((user_id, kind))
+    if rows is None:
+        statement = REFERENCE_QUERIES[kind](user_id).order_by("id")
+        rows = [dict(row._mapping) for row in db.execute(statement)]
+        reference_cache.set((user_id, kind), rows)
+    return rows
+
+
+async def areference_data(db: AsyncSession, user_id: int, kind: str) -> list[dict]:
+    """Versão assíncrona de `reference_data`."""
+    rows = reference_cache.get((user_id, kind))
+    if rows is None:
+        result = await db.execute(REFERENCE_QUERIES[kind](user_id).order_by("id"))
+        rows = [dict(row._mapping) for row in result]
+        reference_cache.set((user_id, kind), rows)
+    return rows
+
+
+def invalidate_reference(user_id: int):
+    """Descarta as listas de referência do usuário (após criar, editar ou excluir)."""
+    for kind in REFERENCE_QUERIES:
+        reference_cache.pop((user_id, kind))
+
+
+def combobox_options(rows: list[dict], label: str = "name") -> list[dict]:
+    """Opções de combobox a partir de uma lista de referência."""
+    return [
+        ComboboxOption(value=row["id"], label=row[label] or row["name"]).model_dump()
+        for row in rows
+    ]
+
+
+# Chave em `session.info` com os usuários cujas listas mudaram na transação corrente
+DIRTY_REFERENCE_KEY = "reference_users"
+REFERENCE_MODELS = (Account, Card, Category)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_reference_users(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, REFERENCE_MODELS) and obj.user_id is not None:
+            session.info.setdefault(DIRTY_REFERENCE_KEY, set()).add(obj.user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_reference_users(session):
+    for user_id in session.info.pop(DIRTY_REFERENCE_KEY, ()):
+        invalidate_reference(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_reference_users(session):
+    session.info.pop(DIRTY_REFERENCE_KEY, None)
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from datetime import date
+
+from sqlalchemy import func, or_, select, update
+from starlette.concurrency import run_in_threadpool
+
+from core.database import SessionLocal
+from core.models import Transaction, TransactionSeries
+from core.occurrences import FREQUENCIES, next_occurrence_date
+from core.periods import add_months
+from core.series import insert_chains
+from core.settings import RECURRING_HORIZON_MONTHS
+
+logger = logging.getLogger("controle.rollover")
+
+# Chave do advisory lock da extensão (par com o id do usuário)
+ROLLOVER_LOCK = 7301
+
+
+def recurrence_horizon(today: date = None) -> date:
+    """Último vencimento que as recorrências materializadas devem ter gerado."""
+    return add_months(today or date.today(), RECURRING_HORIZON_MONTHS)
+
+
+def open_series(today: date = None):
+    """Condição das séries recorrentes materializadas que ainda não terminaram."""
+    return (
+        TransactionSeries.virtual.is_(False),
+        TransactionSeries.frequency.in_(FREQUENCIES),
+        TransactionSeries.total_installments.is_(None),
+        or_(
+            TransactionSeries.end_date.is_(None),
+            TransactionSeries.end_date >= (today or date.today()),
+        ),
+    )
+
+
+def extend_user_series(db, user_id: int, horizon: date, today: date = None) -> int:
+    """Gera as ocorrências das séries abertas do usuário até `horizon`, num único INSERT.
+
+    Cada série continua do vencimento seguinte a `generated_until` (ou à última ocorrência,
+    nas séries anteriores à coluna), que avança junto com o INSERT: rodar de novo não duplica
+    nada e ocorrências excluídas do fim não são recriadas. A última ocorrência restante serve
+    de modelo e de pai. Não faz commit. Retorna quantas ocorrências criou.
+    """
+    last_occurrences = db.execute(
+        select(Transaction, TransactionSeries)
+        .join(TransactionSeries, Transaction.series_id == TransactionSeries.id)
+        .where(TransactionSeries.user_id == user_id, *open_series(today))
+        .order_by(Transaction.series_id, Transaction.due_at.desc(), Transaction.id.desc())
+        .distinct(Transaction.series_id)
+    )
+    chains = []
+    generated = []
+    for last, series in last_occurrences:
+        generated_until = max(series.generated_until or last.due_at, last.due_at)
+        rows = []
+        due_at = next_occurrence_date(generated_until, series.frequency)
+        while due_at <= horizon and (not series.end_date or due_at <= series.end_date):
+            rows.append(
+                {
+                    "user_id": last.user_id,
+                    "account_id": last.account_id,
+                    "card_id": last.card_id,
+                    "category_id": last.category_id,
+                    "value": last.value,
+                    "description": last.description,
+                    "due_at": due_at,
+                    "paid_at": None,
+                    "is_recurring": True,
+                    "recurring_frequency": series.frequency,
+                    "installments": None,
+                    "current_installment": None,
+                }
+            )
+            generated_until = due_at
+            due_at = next_occurrence_date(due_at, series.frequency)
+        if rows:
+            chains.append((rows, last.id, series.id, None))
+        if generated_until != series.generated_until:
+            generated.append({"id": series.id, "generated_until": generated_until})
+    created = insert_chains(db, chains)
+    if generated:
+        db.execute(update(TransactionSeries), generated)
+    return len(created)
+
+
+def roll_over(db, user_id: int = None, today: date = None) -> int:
+    """Estende as recorrências abertas até o horizonte, um usuário (e um commit) por vez.
+
+    Cada usuário é processado sob um advisory lock: outro worker ou o comando
+    `manage.py rollover` rodando ao mesmo tempo pula o usuário em vez de duplicar
+    ocorrências. Retorna o total de ocorrências criadas.
+    """
+    horizon = recurrence_horizon(today)
+    users = select(TransactionSeries.user_id).where(*open_series(today)).distinct()
+    if user_id is not None:
+        users = users.where(TransactionSeries.user_id == user_id)
+
+    created = 0
+    for uid in db.scalars(users).all():
+        if not db.scalar(select(func.pg_try_advisory_xact_lock(ROLLOVER_LOCK, uid))):
+            continue
+        created += extend_user_series(db, uid, horizon, today)
+        db.commit()
+    return created
+
+
+def run_roll_over() -> int:
+    with SessionLocal() as db:
+        return roll_over(db)
+
+
+async def roll_over_periodically(interval: float):
+    """Tarefa de fundo da aplicação: estende as recorrências a cada `interval` segundos."""
+    while True:
+        try:
+            created = await run_in_threadpool(run_roll_over)
+            if created:
+                logger.info("rollover: %s ocorrências criadas", created)
+        except Exception:
+            logger.exception("rollover falhou")
+        await asyncio.sleep(interval)
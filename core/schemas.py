@@ -218,6 +218,10 @@ class TemplateContext(BaseModel):
     sort_by: str
     sort_order: str
 
+    # Paginação por cursor ("Carregar mais" no datagrid)
+    keyset: bool = False
+    next_cursor: Optional[str] = None
+
     @model_validator(mode="before")
     @classmethod
     def populate_context(cls, values: dict) -> dict:
@@ -0,0 +1,24 @@
+from sqlalchemy import func
+
+from core.settings import TRGM_SEARCH_ENABLED
+
+
+def trigram_available(dialect_name: str) -> bool:
+    """Indica se a busca pode usar pg_trgm (índice GIN e função similarity)."""
+    return TRGM_SEARCH_ENABLED and dialect_name == "postgresql"
+
+
+def text_search_filter(column, term: str):
+    """Filtro de trecho de texto (ILIKE '%termo%').
+
+    No Postgres com pg_trgm o índice GIN `gin_trgm_ops` atende o ILIKE com curinga inicial;
+    nos demais bancos o mesmo filtro funciona sem índice.
+    """
+    return column.ilike(f"%{term}%")
+
+
+def text_search_rank(column, term: str, dialect_name: str):
+    """Expressão de relevância (similaridade trigram) ou None quando o banco não suporta."""
+    if not trigram_available(dialect_name):
+        return None
+    return func.similarity(column, term)
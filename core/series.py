@@ -0,0 +1,331 @@
+import re
+from datetime import date
+
+from sqlalchemy import and_, delete, false, func, insert, select, text, update, values
+from sqlalchemy.sql import column
+
+from core.aggregates import mark_period
+from core.models import Transaction, TransactionSeries
+from core.occurrences import FREQUENCIES, next_occurrence_date
+
+# Prefixo "(atual/total) " que as parcelas levam na descrição
+INSTALLMENT_PREFIX = re.compile(r"^\(\d+/\d+\) ")
+
+
+def strip_installment_prefix(description: str) -> str:
+    """Descrição sem o prefixo "(atual/total) " das parcelas."""
+    return INSTALLMENT_PREFIX.sub("", description or "", count=1)
+
+
+def allocate_ids(db, count: int, model=Transaction) -> list[int]:
+    """Reserva `count` ids da sequência da tabela do model numa única consulta."""
+    sequence = func.pg_get_serial_sequence(model.__tablename__, "id")
+    ids = db.scalars(select(func.nextval(sequence)).select_from(func.generate_series(1, count)))
+    return sorted(ids)
+
+
+def insert_chain(
+    db, rows: list[dict], parent_id: int = None, series_id: int = None, first_index: int = None
+) -> list[Transaction]:
+    """Insere uma série encadeada (cada linha filha da anterior) em um único INSERT em lote.
+
+    Os ids são reservados antes, então o `parent_id` de cada linha já é conhecido e a série
+    não precisa de um commit/refresh por ocorrência. Os ids crescem ao longo da série, que é a
+    ordem usada pelas operações por `series_id`. Com `first_index` as linhas recebem também a
+    posição na série (recorrências virtuais). Não faz commit: a série inteira entra (ou não)
+    junto com a transação do chamador.
+    """
+    return insert_chains(db, [(rows, parent_id, series_id, first_index)])
+
+
+def insert_chains(db, chains: list[tuple]) -> list[Transaction]:
+    """Como `insert_chain`, para várias cadeias num só INSERT.
+
+    Cada cadeia é (linhas, parent_id, series_id, first_index).
+    """
+    rows = [row for chain_rows, *_ in chains for row in chain_rows]
+    if not rows:
+        return []
+    ids = iter(allocate_ids(db, len(rows)))
+    for chain_rows, parent_id, series_id, first_index in chains:
+        for position, row in enumerate(chain_rows):
+            row_id = next(ids)
+            series_index = None if first_index is None else first_index + position
+            row.update(
+                id=row_id, parent_id=parent_id, series_id=series_id, series_index=series_index
+            )
+            parent_id = row_id
+            # O INSERT em lote não passa pelo flush: agenda os agregados para o commit
+            mark_period(db, row["user_id"], row.get("paid_at"))
+    # Os chamadores pegam o primeiro objeto de cada cadeia pela posição nas linhas
+    statement = insert(Transaction).returning(Transaction, sort_by_parameter_order=True)
+    return list(db.scalars(statement, rows))
+
+
+def insert_series(db, user_id: int, items: list[tuple]) -> list[Transaction]:
+    """Insere várias transações novas com as ocorrências seguintes num único INSERT.
+
+    `items` são pares (linhas, regra), com a regra da série ou None; as séries também são
+    inseridas em lote, com os ids reservados antes. Não faz commit.
+    """
+    rules = [rule for _, rule in items if rule is not None]
+    series_ids = iter(allocate_ids(db, len(rules), TransactionSeries) if rules else ())
+    series_rows = []
+    chains = []
+    for rows, rule in items:
+        series_id = first_index = None
+        if rule is not None:
+            series_id = next(series_ids)
+            series_rows.append({"id": series_id, "user_id": user_id, **rule})
+            first_index = 0 if rule.get("virtual") else None
+        chains.append((rows, None, series_id, first_index))
+    if series_rows:
+        db.execute(insert(TransactionSeries), series_rows)
+    return insert_chains(db, chains)
+
+
+def save_series(db, user_id: int, series_id: int = None, **rule) -> int:
+    """Cria a série com a regra informada ou atualiza a regra de uma série existente."""
+    if series_id is None:
+        return db.scalar(
+            insert(TransactionSeries)
+            .values(user_id=user_id, **rule)
+            .returning(TransactionSeries.id)
+        )
+    db.execute(
+        update(TransactionSeries).where(TransactionSeries.id == series_id).values(**rule),
+        execution_options={"synchronize_session": "fetch"},
+    )
+    return series_id
+
+
+def following_ids(transaction_id: int):
+    """Ids das ocorrências seguintes (filha, neta...) da transação, via CTE recursiva."""
+    chain = (
+        select(Transaction.id)
+        .where(Transaction.parent_id == transaction_id)
+        .cte("following", recursive=True)
+    )
+    chain = chain.union_all(select(Transaction.id).where(Transaction.parent_id == chain.c.id))
+    return select(chain.c.id)
+
+
+def preceding_ids(transaction_id: int):
+    """Ids da transação e das ocorrências anteriores (pai, avô...), via CTE recursiva."""
+    chain = (
+        select(Transaction.id, Transaction.parent_id)
+        .where(Transaction.id == transaction_id)
+        .cte("preceding", recursive=True)
+    )
+    chain = chain.union_all(
+        select(Transaction.id, Transaction.parent_id).where(Transaction.id == chain.c.parent_id)
+    )
+    return select(chain.c.id)
+
+
+def following(transaction):
+    """Condição das ocorrências seguintes da transação na série.
+
+    Com `series_id` é um filtro indexado (mesma série, id maior, ou posição maior nas
+    recorrências virtuais, cujas exceções são gravadas fora de ordem); transações ainda sem
+    série (antes do `backfill-series`) usam a CTE recursiva sobre `parent_id`.
+    """
+    if transaction.series_index is not None:
+        return (Transaction.series_id == transaction.series_id) & (
+            Transaction.series_index > transaction.series_index
+        )
+    if transaction.series_id is not None:
+        return (Transaction.series_id == transaction.series_id) & (
+            Transaction.id > transaction.id
+        )
+    return Transaction.id.in_(following_ids(transaction.id))
+
+
+def preceding(transaction):
+    """Condição das ocorrências anteriores da transação na série (sem ela)."""
+    if transaction.series_index is not None:
+        return (Transaction.series_id == transaction.series_id) & (
+            Transaction.series_index < transaction.series_index
+        )
+    if transaction.series_id is not None:
+        return (Transaction.series_id == transaction.series_id) & (
+            Transaction.id < transaction.id
+        )
+    if transaction.parent_id is None:
+        return false()
+    return Transaction.id.in_(preceding_ids(transaction.parent_id))
+
+
+def delete_following(db, transaction) -> int:
+    """Exclui num único DELETE todas as ocorrências seguintes. Retorna quantas excluiu."""
+    deleted = db.execute(
+        delete(Transaction)
+        .where(following(transaction))
+        .returning(Transaction.user_id, Transaction.paid_at),
+        execution_options={"synchronize_session": "fetch"},
+    ).all()
+    for user_id, paid_at in deleted:
+        mark_period(db, user_id, paid_at)
+    return len(deleted)
+
+
+def update_preceding(db, transaction, **values) -> int:
+    """Atualiza num único UPDATE todas as ocorrências anteriores da série."""
+    return db.execute(
+        update(Transaction).where(preceding(transaction)).values(**values),
+        execution_options={"synchronize_session": "fetch"},
+    ).rowcount
+
+
+def renumber_preceding(db, transaction, description: str, total_installments: int):
+    """Reescreve "(atual/total) descrição" e o total de parcelas das ocorrências anteriores."""
+    if transaction.series_id is not None:
+        save_series(
+            db,
+            transaction.user_id,
+            transaction.series_id,
+            description=description,
+            total_installments=total_installments,
+        )
+    return update_preceding(
+        db,
+        transaction,
+        description=func.format(
+            "(%s/%s) %s", Transaction.current_installment, total_installments, description
+        ),
+        installments=total_installments,
+    )
+
+
+def add_series_schema(db):
+    """Cria a tabela de séries e as colunas/índices de séries em bancos antigos."""
+    bind = db.connection()
+    TransactionSeries.__table__.create(bind, checkfirst=True)
+    statements = [
+        "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS series_id integer"
+        " REFERENCES transaction_series(id) ON DELETE SET NULL",
+        "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS series_index integer",
+        "CREATE INDEX IF NOT EXISTS ix_transactions_series_id ON transactions (series_id, id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_transactions_series_index"
+        " ON transactions (series_id, series_index)",
+        # Recorrências virtuais (core.occurrences)
+        "ALTER TABLE transaction_series"
+        " ADD COLUMN IF NOT EXISTS virtual boolean NOT NULL DEFAULT false,"
+        " ADD COLUMN IF NOT EXISTS start_date date,"
+        " ADD COLUMN IF NOT EXISTS account_id integer REFERENCES accounts(id) ON DELETE CASCADE,"
+        " ADD COLUMN IF NOT EXISTS card_id integer REFERENCES cards(id) ON DELETE CASCADE,"
+        " ADD COLUMN IF NOT EXISTS category_id integer"
+        " REFERENCES categories(id) ON DELETE CASCADE,"
+        " ADD COLUMN IF NOT EXISTS value numeric(15, 2),"
+        " ADD COLUMN IF NOT EXISTS skipped integer[] NOT NULL DEFAULT '{}'",
+        # Ponto de extensão das recorrências materializadas (core.rollover); preenchido por
+        # `backfill_series`
+        "ALTER TABLE transaction_series ADD COLUMN IF NOT EXISTS generated_until date",
+    ]
+    for statement in statements:
+        db.execute(text(statement))
+    db.commit()
+
+
+def backfill_series(db) -> int:
+    """Cria as séries das cadeias de `parent_id` que ainda não têm `series_id`.
+
+    A regra vem da primeira ocorrência da cadeia; todas as ocorrências recebem o `series_id`
+    num único UPDATE. Depois marca até onde as recorrências já foram geradas
+    (`backfill_generation_points`). Pode ser executado de novo sem efeito. Retorna as séries
+    criadas.
+    """
+    roots = Transaction.__table__.alias("root")
+    has_next = select(Transaction.id).where(Transaction.parent_id == roots.c.id).exists()
+    is_root = and_(
+        roots.c.parent_id.is_(None),
+        roots.c.series_id.is_(None),
+        roots.c.is_recurring.is_(True) | roots.c.installments.isnot(None) | has_next,
+    )
+    series_rows = db.execute(
+        select(
+            roots.c.id,
+            roots.c.user_id,
+            roots.c.recurring_frequency,
+            roots.c.recurring_end_date,
+            roots.c.installments,
+            roots.c.description,
+        )
+        .where(is_root)
+        .order_by(roots.c.id)
+    ).all()
+    if not series_rows:
+        backfill_generation_points(db)
+        return 0
+
+    series_ids = allocate_ids(db, len(series_rows), TransactionSeries)
+    db.execute(
+        insert(TransactionSeries),
+        [
+            {
+                "id": series_id,
+                "user_id": row.user_id,
+                "frequency": row.recurring_frequency,
+                "end_date": row.recurring_end_date,
+                "total_installments": row.installments,
+                "description": (
+                    strip_installment_prefix(row.description)
+                    if row.installments
+                    else row.description
+                ),
+            }
+            for series_id, row in zip(series_ids, series_rows)
+        ],
+    )
+    chain = select(roots.c.id, roots.c.id.label("root_id")).where(is_root).cte(
+        "chain", recursive=True
+    )
+    chain = chain.union_all(
+        select(Transaction.id, chain.c.root_id).where(Transaction.parent_id == chain.c.id)
+    )
+    mapping = values(column("root_id"), column("series_id"), name="mapping").data(
+        [(row.id, series_id) for series_id, row in zip(series_ids, series_rows)]
+    )
+    db.execute(
+        update(Transaction)
+        .where(Transaction.id == chain.c.id, chain.c.root_id == mapping.c.root_id)
+        .values(series_id=mapping.c.series_id),
+        execution_options={"synchronize_session": False},
+    )
+    backfill_generation_points(db)
+    return len(series_rows)
+
+
+def backfill_generation_points(db) -> int:
+    """Preenche `generated_until` das recorrências materializadas que ainda não o têm.
+
+    O ponto é a última ocorrência restante. Nas cadeias antigas, geradas até o fim do ano em
+    que foram criadas, uma última ocorrência antes desse limite (e antes da data final) quer
+    dizer que o fim foi excluído ("esta e as próximas" só apagava as linhas): a série passa a
+    terminar nela, para que core.rollover não recrie o que foi excluído. Retorna as séries
+    atualizadas.
+    """
+    last_occurrences = db.execute(
+        select(Transaction, TransactionSeries)
+        .join(TransactionSeries, Transaction.series_id == TransactionSeries.id)
+        .where(
+            TransactionSeries.generated_until.is_(None),
+            TransactionSeries.virtual.is_(False),
+            TransactionSeries.frequency.in_(FREQUENCIES),
+            TransactionSeries.total_installments.is_(None),
+        )
+        .order_by(Transaction.series_id, Transaction.due_at.desc(), Transaction.id.desc())
+        .distinct(Transaction.series_id)
+    )
+    points = []
+    for last, series in last_occurrences:
+        point = {"id": series.id, "generated_until": last.due_at}
+        # Limite da geração que criou a última ocorrência
+        horizon = date((last.created_at or last.due_at).year, 12, 31)
+        due_at = next_occurrence_date(last.due_at, series.frequency)
+        if due_at <= horizon and (not series.end_date or due_at <= series.end_date):
+            point["end_date"] = last.due_at
+        points.append(point)
+    if points:
+        db.execute(update(TransactionSeries), points)
+    return len(points)
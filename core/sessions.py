@@ -0,0 +1,159 @@
+import json
+import logging
+import secrets
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+
+from core.cache import TTLCache
+from core.database import AsyncSessionLocal
+from core.models import WebSession
+from core.settings import (
+    SESSION_BACKEND,
+    SESSION_COOKIE_NAME,
+    SESSION_MAX_ENTRIES,
+    SESSION_TTL_SECONDS,
+    WEB_CONCURRENCY,
+)
+
+logger = logging.getLogger("controle.sessions")
+
+
+class MemorySessionBackend:
+    """Sessões na memória do worker; só serve para um único processo."""
+
+    def __init__(self, ttl: int, maxsize: int):
+        self.ttl = ttl
+        # Guarda o JSON serializado: o dict da requisição nunca é compartilhado
+        self._cache = TTLCache("sessions", maxsize, ttl)
+
+    async def load(self, session_id: str):
+        data = self._cache.get(session_id)
+        return json.loads(data) if data is not None else None
+
+    async def save(self, session_id: str, data: dict):
+        self._cache.set(session_id, json.dumps(data))
+
+    async def delete(self, session_id: str):
+        self._cache.pop(session_id)
+
+
+class DatabaseSessionBackend:
+    """Sessões na tabela `web_sessions`, compartilhadas entre workers."""
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    async def load(self, session_id: str):
+        async with AsyncSessionLocal() as db:
+            return await db.scalar(
+                select(WebSession.data).where(
+                    WebSession.id == session_id,
+                    WebSession.expires_at > datetime.now(timezone.utc),
+                )
+            )
+
+    async def save(self, session_id: str, data: dict):
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        statement = insert(WebSession).values(id=session_id, data=data, expires_at=expires_at)
+        statement = statement.on_conflict_do_update(
+            index_elements=[WebSession.id],
+            set_={"data": statement.excluded.data, "expires_at": statement.excluded.expires_at},
+        )
+        async with AsyncSessionLocal() as db:
+            await db.execute(statement)
+            await db.commit()
+
+    async def delete(self, session_id: str):
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(WebSession).where(WebSession.id == session_id))
+            await db.commit()
+
+
+def add_sessions_schema(db):
+    """Cria a tabela `web_sessions` em bancos antigos (necessária com SESSION_BACKEND=database)."""
+    WebSession.__table__.create(db.connection(), checkfirst=True)
+    db.commit()
+
+
+def purge_expired_sessions(db) -> int:
+    """Remove as sessões expiradas da tabela. Retorna quantas removeu."""
+    removed = db.execute(
+        delete(WebSession).where(WebSession.expires_at <= datetime.now(timezone.utc))
+    ).rowcount
+    db.commit()
+    return removed
+
+
+def create_session_backend(name: str = SESSION_BACKEND):
+    if name == "memory":
+        if WEB_CONCURRENCY > 1:
+            logger.warning(
+                "SESSION_BACKEND=memory com %s workers: cada worker tem as próprias sessões e "
+                "os alertas se perdem entre requisições; use SESSION_BACKEND=database",
+                WEB_CONCURRENCY,
+            )
+        return MemorySessionBackend(SESSION_TTL_SECONDS, SESSION_MAX_ENTRIES)
+    if name == "database":
+        return DatabaseSessionBackend(SESSION_TTL_SECONDS)
+    raise ValueError(f"SESSION_BACKEND inválido: {name}")
+
+
+class ServerSessionMiddleware:
+    """Substitui o SessionMiddleware do Starlette: o cookie leva só um id opaco.
+
+    O conteúdo de `request.session` fica no backend e só é gravado quando muda; uma sessão
+    esvaziada (alertas já exibidos) é removida junto com o cookie.
+    """
+
+    def __init__(self, app, backend=None, cookie_name: str = SESSION_COOKIE_NAME):
+        self.app = app
+        self.backend = backend or create_session_backend()
+        self.cookie_name = cookie_name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        session_id = HTTPConnection(scope).cookies.get(self.cookie_name)
+        data = await self.backend.load(session_id) if session_id else None
+        scope["session"] = data or {}
+        initial = json.dumps(data, sort_keys=True) if data else None
+        # Cookie de uma sessão expirada ou desconhecida: nunca reaproveita o id recebido
+        stale = session_id is not None and not data
+        if stale:
+            session_id = None
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                await self._commit(scope["session"], session_id, initial, stale, message)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _commit(self, session: dict, session_id, initial, stale: bool, message):
+        current = json.dumps(session, sort_keys=True) if session else None
+        headers = MutableHeaders(scope=message)
+        if current is None:
+            if session_id is not None:
+                await self.backend.delete(session_id)
+            if session_id is not None or stale:
+                headers.append(
+                    "Set-Cookie", f"{self.cookie_name}=; path=/; Max-Age=0; httponly; samesite=lax"
+                )
+            return
+        if current == initial:
+            return
+
+        if session_id is None:
+            session_id = secrets.token_urlsafe(32)
+        await self.backend.save(session_id, session)
+        headers.append(
+            "Set-Cookie",
+            f"{self.cookie_name}={session_id}; path=/; Max-Age={self.backend.ttl}; "
+            "httponly; samesite=lax",
+        )
@@ -0,0 +1,64 @@
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import date, datetime, time
+from itertools import islice
+
+from openpyxl import load_workbook
+
+# Bytes copiados por vez do upload para o arquivo temporário
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+
+@contextmanager
+def spooled_upload(upload, suffix: str = ".xlsx"):
+    """Copia o upload em blocos para um arquivo temporário em disco e devolve o caminho."""
+    with tempfile.NamedTemporaryFile(suffix=suffix) as spool:
+        upload.file.seek(0)
+        shutil.copyfileobj(upload.file, spool, SPOOL_CHUNK_SIZE)
+        spool.flush()
+        yield spool.name
+
+
+def iter_sheet_rows(path: str, sheet_name: str):
+    """Linhas da aba como (número da linha, dict coluna -> valor), lidas em streaming.
+
+    A primeira linha é o cabeçalho. O openpyxl em modo read_only não carrega a planilha
+    inteira: cada linha é lida do XML quando pedida. Células vazias vêm como None.
+    """
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = [str(name).strip() if name is not None else None for name in next(rows, ())]
+        for number, values in enumerate(rows, start=2):
+            yield number, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def batched(iterable, size: int):
+    """Lista de até `size` itens por vez."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def is_blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def cell_datetime(value):
+    """Célula de data/hora: datetime do Excel, date ou texto ISO. None se vazia."""
+    if is_blank(value):
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, time())
+    return datetime.fromisoformat(str(value).strip())
+
+
+def cell_date(value):
+    """Célula de data: date, datetime do Excel ou texto ISO. None se vazia."""
+    value = cell_datetime(value)
+    return value.date() if value is not None else None
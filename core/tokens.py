@@ -0,0 +1,79 @@
+from sqlalchemy import select, text, update
+
+from core.cache import TTLCache
+from core.models import User
+from core.schemas import UserOut
+from core.settings import AUTH_CACHE_MAX_ENTRIES, TOKEN_VERSION_CACHE_TTL_SECONDS
+
+# Claims do perfil que vão no token, suficientes para montar o UserOut sem consultar o banco
+PROFILE_CLAIMS = ("name", "username", "created_at", "updated_at")
+
+# Versão de token vigente por usuário; um miss custa uma consulta pela chave primária
+token_versions = TTLCache("token_version", AUTH_CACHE_MAX_ENTRIES, TOKEN_VERSION_CACHE_TTL_SECONDS)
+
+
+def session_claims(user) -> dict:
+    """Claims do token de sessão: e-mail em `sub`, id, versão do token e dados do perfil.
+
+    O perfil reflete o momento do login; alterações passam a valer no próximo login.
+    """
+    profile = UserOut.model_validate(user).model_dump(mode="json")
+    return {
+        "sub": user.email,
+        "uid": user.id,
+        "ver": user.token_version,
+        **{claim: profile[claim] for claim in PROFILE_CLAIMS},
+    }
+
+
+def is_stateless(payload: dict) -> bool:
+    """Indica se o token carrega as claims do usuário (tokens antigos só têm o e-mail)."""
+    return "uid" in payload and "ver" in payload
+
+
+def user_from_claims(payload: dict) -> UserOut:
+    """Monta o usuário autenticado a partir das claims do token."""
+    return UserOut(
+        id=payload["uid"],
+        email=payload["sub"],
+        **{claim: payload[claim] for claim in PROFILE_CLAIMS},
+    )
+
+
+async def current_token_version(db, user_id: int):
+    """Versão de token vigente do usuário (None se ele não existe mais), numa AsyncSession."""
+    version = token_versions.get(user_id)
+    if version is None:
+        version = await db.scalar(select(User.token_version).where(User.id == user_id))
+        if version is not None:
+            token_versions.set(user_id, version)
+    return version
+
+
+def revoke_tokens(db, user_id: int = None) -> int:
+    """Invalida os tokens emitidos de um usuário (ou de todos). Retorna os usuários afetados.
+
+    Só o cache deste processo é limpo: os outros workers continuam aceitando os tokens
+    revogados até a versão expirar do `token_versions` de cada um, ou seja, por até
+    TOKEN_VERSION_CACHE_TTL_SECONDS (30 s por padrão).
+    """
+    statement = update(User).values(token_version=User.token_version + 1)
+    if user_id is not None:
+        statement = statement.where(User.id == user_id)
+    revoked = db.execute(statement, execution_options={"synchronize_session": False}).rowcount
+    db.commit()
+    if user_id is None:
+        token_versions.clear()
+    else:
+        token_versions.pop(user_id)
+    return revoked
+
+
+def add_token_version_column(db):
+    """Cria a coluna `users.token_version` em bancos anteriores a ela."""
+    db.execute(
+        text(
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version integer NOT NULL DEFAULT 1"
+        )
+    )
+    db.commit()
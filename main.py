@@ -1,18 +1,36 @@
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy import inspect
 from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.middleware.sessions import SessionMiddleware
 from starlette.responses import RedirectResponse
 
+import core.aggregates  # noqa: F401 - registra a manutenção dos agregados mensais
+import core.category_tree  # noqa: F401 - registra a manutenção da hierarquia de categorias
+import core.reference  # noqa: F401 - registra a invalidação do cache de referências
 import core.settings as settings
-from core.database import Base, engine
+from core.database import READ_ONLY_METHODS, Base, engine, pin_to_primary
 from core.fixtures import fixtures
-from routes import accounts, budgets, cards, categories, index, login, register, transactions
+from core.passwords import password_hasher
+from core.query_stats import log_request_stats, start_request_stats, stop_request_stats
+from core.rollover import roll_over_periodically
+from core.sessions import ServerSessionMiddleware
+from routes import (
+    accounts,
+    budgets,
+    cards,
+    categories,
+    index,
+    login,
+    metrics,
+    register,
+    transactions,
+)
 
 app = FastAPI()
-app.add_middleware(SessionMiddleware, settings.SECRET_KEY)
+app.add_middleware(ServerSessionMiddleware)
 
 
 class RedirectUnauthorizedMiddleware(BaseHTTPMiddleware):
@@ -26,8 +44,39 @@ class RedirectUnauthorizedMiddleware(BaseHTTPMiddleware):
         return response
 
 
+class ReadYourWritesMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        response = await call_next(request)
+
+        # Após uma escrita bem-sucedida, as próximas leituras do usuário vão para o primário
+        if request.method not in READ_ONLY_METHODS and response.status_code < 400:
+            pin_to_primary(response)
+
+        return response
+
+
+class QueryStatsMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        stats, token = start_request_stats()
+        try:
+            response = await call_next(request)
+        finally:
+            stop_request_stats(token)
+
+        # Quantidade e tempo de SQL da requisição, chaveados pelo path da rota
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else request.url.path
+        log_request_stats(stats, request.method, route_path, response.status_code)
+        if settings.QUERY_STATS_HEADERS:
+            response.headers.update(stats.as_headers())
+
+        return response
+
+
 # Adiciona o middleware na aplicação
 app.add_middleware(RedirectUnauthorizedMiddleware)
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(QueryStatsMiddleware)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # CORS
@@ -40,6 +89,23 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def start_rollover():
+    # Extensão periódica das recorrências abertas (ver core.rollover)
+    if settings.RECURRING_ROLLOVER_INTERVAL_SECONDS > 0:
+        app.state.rollover = asyncio.create_task(
+            roll_over_periodically(settings.RECURRING_ROLLOVER_INTERVAL_SECONDS)
+        )
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    password_hasher.shutdown()
+    rollover = getattr(app.state, "rollover", None)
+    if rollover is not None:
+        rollover.cancel()
+
+
 # @app.on_event("startup")
 # def startup_event():
 #     Base.metadata.drop_all(bind=engine)
@@ -61,3 +127,4 @@ app.include_router(categories.router)
 app.include_router(budgets.router)
 app.include_router(transactions.router)
 app.include_router(index.router)
+app.include_router(metrics.router)
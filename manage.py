@@ -0,0 +1,173 @@
+import argparse
+
+
+def create_indexes(args):
+    from core.indexes import create_indexes
+
+    create_indexes(concurrently=not args.blocking)
+
+
+def migrate(args):
+    from core.aggregates import add_aggregates_schema, rebuild_aggregates
+    from core.category_tree import rebuild_category_tree
+    from core.database import SessionLocal
+    from core.indexes import create_indexes
+    from core.series import add_series_schema, backfill_series
+    from core.sessions import add_sessions_schema
+    from core.tokens import add_token_version_column
+
+    with SessionLocal() as db:
+        if db.get_bind().dialect.name == "postgresql":
+            # Só cria a coluna (versão 1 para todos): nenhuma sessão é revogada
+            add_token_version_column(db)
+            # Séries e o ponto de extensão das recorrências (core.rollover); as cadeias de
+            # `parent_id` anteriores às séries ganham a sua aqui
+            add_series_schema(db)
+            created = backfill_series(db)
+            db.commit()
+            if created:
+                print(f"{created} séries criadas para cadeias existentes.")
+        # Colunas da hierarquia antes de tudo: qualquer select(Category) depende delas
+        updated = rebuild_category_tree(db)
+        if updated:
+            print(f"Hierarquia de {updated} categorias recalculada.")
+        if add_aggregates_schema(db):
+            periods = rebuild_aggregates(db)
+            print(f"Tabela monthly_aggregates criada ({periods} períodos calculados).")
+        add_sessions_schema(db)
+    # Por último: os índices dependem das tabelas e colunas criadas acima
+    create_indexes(concurrently=not args.blocking)
+    print("Schema atualizado.")
+
+
+def rebuild_aggregates(args):
+    from core.aggregates import add_aggregates_schema, rebuild_aggregates
+    from core.database import SessionLocal
+
+    with SessionLocal() as db:
+        add_aggregates_schema(db)
+        periods = rebuild_aggregates(db, user_id=args.user)
+    print(f"{periods} períodos recalculados.")
+
+
+def rebuild_category_tree(args):
+    from core.category_tree import rebuild_category_tree
+    from core.database import SessionLocal
+
+    with SessionLocal() as db:
+        updated = rebuild_category_tree(db)
+    print(f"{updated} categorias atualizadas.")
+
+
+def revoke_sessions(args):
+    from core.database import SessionLocal
+    from core.tokens import revoke_tokens
+
+    with SessionLocal() as db:
+        revoked = revoke_tokens(db, user_id=args.user)
+    print(f"Sessões de {revoked} usuários revogadas.")
+
+
+def purge_sessions(args):
+    from core.database import SessionLocal
+    from core.sessions import add_sessions_schema, purge_expired_sessions
+
+    with SessionLocal() as db:
+        add_sessions_schema(db)
+        removed = purge_expired_sessions(db)
+    print(f"{removed} sessões expiradas removidas.")
+
+
+def backfill_series(args):
+    from core.database import SessionLocal
+    from core.indexes import create_indexes
+    from core.series import add_series_schema, backfill_series
+
+    with SessionLocal() as db:
+        add_series_schema(db)
+        created = backfill_series(db)
+        db.commit()
+    print(f"{created} séries criadas.")
+
+
+def rollover(args):
+    from core.database import SessionLocal
+    from core.rollover import roll_over
+
+    with SessionLocal() as db:
+        created = roll_over(db, user_id=args.user)
+    print(f"{created} ocorrências criadas.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comandos de manutenção do Controle.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    cmd = subparsers.add_parser(
+        "migrate",
+        help="Cria tabelas, colunas e índices que faltam no banco (rodar antes de cada deploy).",
+    )
+    cmd.add_argument(
+        "--blocking",
+        action="store_true",
+        help="Usa CREATE INDEX comum (bloqueia escritas) em vez de CONCURRENTLY.",
+    )
+    cmd.set_defaults(func=migrate)
+
+    cmd = subparsers.add_parser(
+        "create-indexes", help="Cria os índices dos models que ainda não existem no banco."
+    )
+    cmd.add_argument(
+        "--blocking",
+        action="store_true",
+        help="Usa CREATE INDEX comum (bloqueia escritas) em vez de CONCURRENTLY.",
+    )
+    cmd.set_defaults(func=create_indexes)
+
+    cmd = subparsers.add_parser(
+        "rebuild-aggregates",
+        help="Recalcula do zero os agregados mensais das transações pagas.",
+    )
+    cmd.add_argument("--user", type=int, default=None, help="Recalcula apenas este usuário.")
+    cmd.set_defaults(func=rebuild_aggregates)
+
+    cmd = subparsers.add_parser(
+        "rebuild-category-tree",
+        help="Cria as colunas da hierarquia de categorias e recalcula caminho, rótulo e raiz.",
+    )
+    cmd.set_defaults(func=rebuild_category_tree)
+
+    cmd = subparsers.add_parser(
+        "revoke-sessions",
+        help=(
+            "Invalida os tokens de sessão emitidos (requer `migrate`). Os workers em execução "
+            "podem aceitar os tokens revogados por até TOKEN_VERSION_CACHE_TTL_SECONDS (30 s)."
+        ),
+    )
+    cmd.add_argument("--user", type=int, default=None, help="Revoga apenas este usuário.")
+    cmd.set_defaults(func=revoke_sessions)
+
+    cmd = subparsers.add_parser(
+        "purge-sessions", help="Remove da tabela web_sessions as sessões expiradas."
+    )
+    cmd.set_defaults(func=purge_sessions)
+
+    cmd = subparsers.add_parser(
+        "backfill-series",
+        help="Cria a tabela de séries e associa as cadeias de recorrências/parcelas existentes.",
+    )
+    cmd.set_defaults(func=backfill_series)
+
+    cmd = subparsers.add_parser(
+        "rollover",
+        help="Estende as recorrências abertas até o horizonte (RECURRING_HORIZON_MONTHS).",
+    )
+    cmd.add_argument("--user", type=int, default=None, help="Estende apenas este usuário.")
+    cmd.set_defaults(func=rollover)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,11 @@ from typing import Optional
 
 from fastapi import APIRouter, Depends, Form, Query, Request
 from fastapi.responses import RedirectResponse
-from sqlalchemy import asc, desc
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from core.database import get_db
+from core.listing import ListQuery
 from core.models import Account
 from core.schemas import (
     AccountOut,
@@ -36,27 +37,22 @@ def get_accounts(
     bank: Optional[str] = Query(None, alias="f_bank"),
 ):
     # Constrói a query base
-    query = db.query(Account).filter(Account.user_id == user.id)
-    if name:
-        query = query.filter(Account.name.ilike(f"%{name}%"))
-    if bank:
-        query = query.filter(Account.bank == bank)
-
-    # Mapeia a ordenação
-    sort_map = {
-        "id": Account.id,
-        "name": Account.name,
-        "bank": Account.bank,
-        "updated_at": Account.updated_at,
-    }
-    sort_column = sort_map.get(sort_by, Account.id)
-    if sort_order.lower() == "desc":
-        query = query.order_by(desc(sort_column))
-    else:
-        query = query.order_by(asc(sort_column))
-
-    total_count = query.count()
-    accounts_list = query.offset((page - 1) * per_page).limit(per_page).all()
+    list_query = ListQuery(
+        select(Account).where(Account.user_id == user.id),
+        Account.id,
+        {
+            "id": Account.id,
+            "name": Account.name,
+            "bank": Account.bank,
+            "updated_at": Account.updated_at,
+        },
+    )
+    list_query.filter_contains(Account.name, name)
+    list_query.filter_equals(Account.bank, bank)
+    list_query.order(sort_by, sort_order)
+
+    # Página e total em uma única consulta
+    accounts_list, total_count, _ = list_query.fetch(db, page, per_page)
 
     # Monta as colunas usando o schema Column
     columns = [
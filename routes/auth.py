@@ -1,31 +1,70 @@
+import time
+
 from fastapi import APIRouter, Cookie, Depends, Request
 from fastapi.templating import Jinja2Templates
 from jose import jwt
 from passlib.context import CryptContext
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
-from core.database import get_db
+from core.cache import TTLCache
 from core.models import User
-from core.settings import ALGORITHM, SECRET_KEY
+from core.schemas import UserOut
+from core.settings import ALGORITHM, AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL_SECONDS, SECRET_KEY
+from core.tokens import current_token_version, is_stateless, token_versions, user_from_claims
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Token de sessão já verificado -> dados do usuário (UserOut, sem senha nem relacionamentos)
+user_cache = TTLCache("auth", AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL_SECONDS)
+# Chave em `session.info` com os usuários alterados na transação corrente
+DIRTY_USERS_KEY = "auth_users"
+
+
+def invalidate_user(user_id: int):
+    """Descarta os dados em cache do usuário (após alterar ou excluir o usuário)."""
+    user_cache.pop_matching(lambda user: user.id == user_id)
+    token_versions.pop(user_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_dirty_users(session, flush_context):
+    for obj in (*session.dirty, *session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            session.info.setdefault(DIRTY_USERS_KEY, set()).add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_dirty_users(session):
+    for user_id in session.info.pop(DIRTY_USERS_KEY, ()):
+        invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_dirty_users(session):
+    session.info.pop(DIRTY_USERS_KEY, None)
+
 
 from fastapi import Cookie, Depends, HTTPException
 from jose import jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.database import get_db
+from core.database import get_async_db
 from core.models import User
 from core.settings import ALGORITHM, SECRET_KEY
 
 
-def get_current_user(
-    request: Request, session_token: str = Cookie(None), db: Session = Depends(get_db)
+async def get_current_user(
+    request: Request, session_token: str = Cookie(None), db: AsyncSession = Depends(get_async_db)
 ):
-    """Obtém o usuário autenticado pelo token no cookie de sessão. Se falhar, levanta um erro 401."""
+    """Obtém o usuário autenticado pelo token no cookie de sessão. Se falhar, levanta um erro 401.
+
+    Assíncrona: nem as rotas síncronas ocupam uma thread do threadpool só para autenticar, e a
+    sessão só pega uma conexão no miss dos caches.
+    """
     if hasattr(request.state, "user"):
         return request.state.user
 
@@ -34,19 +73,41 @@ def get_current_user(
 
     try:
         payload = jwt.decode(session_token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_email = payload.get("sub")
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expirado")
+    except jwt.JWTError:
+        raise HTTPException(status_code=401, detail="Token inválido")
+
+    if is_stateless(payload):
+        # Token com as claims do usuário: basta conferir a versão (em cache) para aceitar
+        version = await current_token_version(db, payload["uid"])
+        if version is None:
+            raise HTTPException(status_code=401, detail="Usuário não encontrado")
+        if version != payload["ver"]:
+            raise HTTPException(status_code=401, detail="Sessão revogada")
+        user = user_from_claims(payload)
+    else:
+        user = await user_from_email_token(db, session_token, payload)
+
+    request.state.user = user
+    return user
 
+
+async def user_from_email_token(
+    db: AsyncSession, session_token: str, payload: dict
+) -> UserOut:
+    """Usuário de um token antigo, que só traz o e-mail em `sub` (consulta o banco no miss)."""
+    user = user_cache.get(session_token)
+    if user is None:
+        user_email = payload.get("sub")
         if not user_email:
             raise HTTPException(status_code=401, detail="Token inválido")
 
-        user = db.query(User).filter(User.email == user_email).first()
-        if not user:
+        db_user = await db.scalar(select(User).where(User.email == user_email))
+        if not db_user:
             raise HTTPException(status_code=401, detail="Usuário não encontrado")
-        request.state.user = user
-        print("setting user in request.state")
-        return user
-
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expirado")
-    except jwt.JWTError:
-        raise HTTPException(status_code=401, detail="Token inválido")
+        user = UserOut.model_validate(db_user)
+        # Não mantém em cache além da expiração do próprio token
+        expires_in = payload["exp"] - time.time() if "exp" in payload else None
+        user_cache.set(session_token, user, ttl=expires_in)
+    return user
@@ -2,11 +2,13 @@ from datetime import date, datetime
 
 from fastapi import APIRouter, Depends, Form, Query, Request
 from fastapi.responses import RedirectResponse
-from sqlalchemy import asc, desc
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.orm import Session, contains_eager
 
 from core.database import get_db
+from core.listing import ListQuery
 from core.models import Budget, Category
+from core.reference import combobox_options, reference_data
 from core.schemas import (
     BudgetOut,
     Column,
@@ -46,35 +48,28 @@ def get_budgets(
     month: str = Query(None, alias="f_month"),
 ):
     # Constrói a query base (faz join com Category para permitir ordenação por nome da categoria)
-    query = (
-        db.query(Budget)
-        .filter(Budget.user_id == user.id)
+    list_query = ListQuery(
+        select(Budget)
         .join(Category, Budget.category_id == Category.id)
+        .options(contains_eager(Budget.category))
+        .where(Budget.user_id == user.id),
+        Budget.id,
+        {
+            "id": Budget.id,
+            "category_name": Category.name,
+            "limit_value": Budget.limit_value,
+            "month": Budget.month,
+        },
     )
-    if category_id:
-        query = query.filter(Budget.category_id == category_id)
-    if month:
-        try:
-            month_date = parse_month_input(month)
-            query = query.filter(Budget.month == month_date)
-        except ValueError:
-            alert_error(request, "Formato inválido para mês.")
-
-    # Ordenação
-    sort_map = {
-        "id": Budget.id,
-        "category_name": Category.name,
-        "limit_value": Budget.limit_value,
-        "month": Budget.month,
-    }
-    sort_column = sort_map.get(sort_by, Budget.id)
-    if sort_order.lower() == "desc":
-        query = query.order_by(desc(sort_column))
-    else:
-        query = query.order_by(asc(sort_column))
+    list_query.filter_equals(Budget.category_id, category_id)
+    try:
+        list_query.filter_equals(Budget.month, month, parse_month_input)
+    except ValueError:
+        alert_error(request, "Formato inválido para mês.")
+    list_query.order(sort_by, sort_order)
 
-    total_count = query.count()
-    budgets = query.offset((page - 1) * per_page).limit(per_page).all()
+    # Página e total em uma única consulta
+    budgets, total_count, _ = list_query.fetch(db, page, per_page)
 
     # Definição das colunas usando o schema Column
     columns = [
@@ -100,10 +95,7 @@ def get_budgets(
         values.append([b.id, category_html, b.limit_value, month_str])
 
     # Schema CRUD para criação/edição
-    category_options = [
-        ComboboxOption(value=c.id, label=c.name).model_dump()
-        for c in db.query(Category).filter(Category.user_id == user.id).all()
-    ]
+    category_options = combobox_options(reference_data(db, user.id, "categories"))
     crud_schema = [
         CrudField(
             name="category_id",
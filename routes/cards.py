@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, Form, Query, Request
 from fastapi.responses import RedirectResponse
-from sqlalchemy import asc, desc
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from core.database import get_db
-from core.models import Account, Card
+from core.listing import ListQuery
+from core.models import Card
+from core.reference import combobox_options, reference_data
 from core.schemas import (
     BrandName,
     CardOut,
@@ -35,30 +37,25 @@ def get_cards(
     brand: str = Query(None, alias="f_brand"),
 ):
     # Constrói a query base
-    query = db.query(Card).filter(Card.user_id == user.id)
-    if name:
-        query = query.filter(Card.name.ilike(f"%{name}%"))
-    if brand:
-        query = query.filter(Card.brand == brand)
-    if account_id:
-        query = query.filter(Card.account_id == account_id)
-
-    sort_map = {
-        "id": Card.id,
-        "name": Card.name,
-        "brand": Card.brand,
-        "due_day": Card.due_day,
-        "close_day": Card.close_day,
-        "updated_at": Card.updated_at,
-    }
-    sort_column = sort_map.get(sort_by, Card.id)
-    if sort_order.lower() == "desc":
-        query = query.order_by(desc(sort_column))
-    else:
-        query = query.order_by(asc(sort_column))
-
-    total_count = query.count()
-    cards = query.offset((page - 1) * per_page).limit(per_page).all()
+    list_query = ListQuery(
+        select(Card).where(Card.user_id == user.id),
+        Card.id,
+        {
+            "id": Card.id,
+            "name": Card.name,
+            "brand": Card.brand,
+            "due_day": Card.due_day,
+            "close_day": Card.close_day,
+            "updated_at": Card.updated_at,
+        },
+    )
+    list_query.filter_contains(Card.name, name)
+    list_query.filter_equals(Card.brand, brand)
+    list_query.filter_equals(Card.account_id, account_id)
+    list_query.order(sort_by, sort_order)
+
+    # Página e total em uma única consulta
+    cards, total_count, _ = list_query.fetch(db, page, per_page)
 
     # Define as colunas para o datagrid usando o schema Column
     columns = [
@@ -85,7 +82,7 @@ def get_cards(
         )
 
     # Opções para os campos do CRUD (usando ComboboxOption)
-    accounts = db.query(Account).filter(Account.user_id == user.id).all()
+    account_options = combobox_options(reference_data(db, user.id, "accounts"))
     crud_schema = [
         CrudField(
             name="account_id",
@@ -93,7 +90,7 @@ def get_cards(
             type="combobox",
             required=True,
             edit=True,
-            options=[ComboboxOption(value=acc.id, label=acc.name).model_dump() for acc in accounts],
+            options=account_options,
         ),
         CrudField(name="name", label="Nome", type="text", required=True, edit=True),
         CrudField(
@@ -125,7 +122,7 @@ def get_cards(
             name="account_id",
             label="Conta",
             type="combobox",
-            options=[ComboboxOption(value=acc.id, label=acc.name).model_dump() for acc in accounts],
+            options=account_options,
         ),
         FilterField(name="name", label="Nome", type="text"),
         FilterField(
@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, Form, Query, Request
 from fastapi.responses import RedirectResponse
-from sqlalchemy import asc, desc
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
+from core import loaders
 from core.database import get_db
+from core.listing import ListQuery
 from core.models import Category, Transaction
+from core.reference import combobox_options, reference_data
 from core.schemas import (
     CategoryDetail,
     CategoryOut,
@@ -37,29 +40,24 @@ def get_categories(
     type_filter: str = Query(None, alias="f_type_filter"),
 ):
     # Constrói a query base para categorias "pais"
-    query = db.query(Category).filter(Category.user_id == user.id, Category.parent_id == None)
-    if name:
-        query = query.filter(Category.name.ilike(f"%{name}%"))
-    if type_filter:
-        try:
-            query = query.filter(Category.type == CategoryType(type_filter))
-        except Exception:
-            alert_error(request, "Tipo de categoria inválido.")
-
-    # Ordenação
-    sort_map = {
-        "id": Category.id,
-        "name": Category.name,
-        "type": Category.type,
-    }
-    sort_column = sort_map.get(sort_by, Category.id)
-    if sort_order.lower() == "desc":
-        query = query.order_by(desc(sort_column))
-    else:
-        query = query.order_by(asc(sort_column))
-
-    total_count = query.count()
-    categories = query.offset((page - 1) * per_page).limit(per_page).all()
+    list_query = ListQuery(
+        select(Category).where(Category.user_id == user.id, Category.parent_id.is_(None)),
+        Category.id,
+        {
+            "id": Category.id,
+            "name": Category.name,
+            "type": Category.type,
+        },
+    )
+    list_query.filter_contains(Category.name, name)
+    try:
+        list_query.filter_equals(Category.type, type_filter, CategoryType)
+    except ValueError:
+        alert_error(request, "Tipo de categoria inválido.")
+    list_query.order(sort_by, sort_order)
+
+    # Página e total em uma única consulta
+    categories, total_count, _ = list_query.fetch(db, page, per_page)
 
     # Monta as colunas usando os schemas (Column)
     columns = [
@@ -70,6 +68,29 @@ def get_categories(
         Column(label="Transações", type="number", sort=False),
     ]
 
+    # Subcategorias diretas e transações da categoria e das subcategorias diretas, por
+    # consultas agrupadas para a página inteira
+    page_ids = [cat.id for cat in categories]
+    subcategories_count = dict(
+        db.query(Category.parent_id, func.count())
+        .filter(Category.parent_id.in_(page_ids))
+        .group_by(Category.parent_id)
+        .all()
+    )
+    own_transactions = dict(
+        db.query(Transaction.category_id, func.count())
+        .filter(Transaction.category_id.in_(page_ids))
+        .group_by(Transaction.category_id)
+        .all()
+    )
+    subcategory_transactions = dict(
+        db.query(Category.parent_id, func.count(Transaction.id))
+        .join(Transaction, Transaction.category_id == Category.id)
+        .filter(Category.parent_id.in_(page_ids))
+        .group_by(Category.parent_id)
+        .all()
+    )
+
     # Monta os valores
     values = []
     for cat in categories:
@@ -79,20 +100,21 @@ def get_categories(
             else cat.name
         )
         cat_type = "Receita" if cat.type == CategoryType.income else "Despesa"
-        subcats = db.query(Category).filter(Category.parent_id == cat.id).all()
-        transactions_count = db.query(Transaction).filter(Transaction.category_id == cat.id).count()
-        for sub in subcats:
-            transactions_count += (
-                db.query(Transaction).filter(Transaction.category_id == sub.id).count()
-            )
-        values.append([cat.id, name_html, cat_type, len(subcats), transactions_count])
+        values.append(
+            [
+                cat.id,
+                name_html,
+                cat_type,
+                subcategories_count.get(cat.id, 0),
+                own_transactions.get(cat.id, 0) + subcategory_transactions.get(cat.id, 0),
+            ]
+        )
 
     # Cria o schema para o CRUD (para o modal de adicionar/editar)
-    parent_options = [ComboboxOption(value="", label="Ninguém")]
-    for c in (
-        db.query(Category).filter(Category.user_id == user.id, Category.parent_id == None).all()
-    ):
-        parent_options.append(ComboboxOption(value=c.id, label=c.name))
+    parent_options = [ComboboxOption(value="", label="Ninguém").model_dump()]
+    parent_options += combobox_options(
+        [c for c in reference_data(db, user.id, "categories") if c["parent_id"] is None]
+    )
 
     crud_schema = [
         CrudField(
@@ -101,7 +123,7 @@ def get_categories(
             type="combobox",
             required=True,
             edit=True,
-            options=[option.model_dump() for option in parent_options],
+            options=parent_options,
         ),
         CrudField(name="name", label="Nome", type="text", required=True, edit=True),
         CrudField(
@@ -199,7 +221,10 @@ def get_category_details(
 ):
     """Retorna os detalhes da categoria"""
     category = (
-        db.query(Category).filter(Category.id == category_id, Category.user_id == user.id).first()
+        db.query(Category)
+        .options(*loaders.category_detail())
+        .filter(Category.id == category_id, Category.user_id == user.id)
+        .first()
     )
 
     subcategories_list = [
@@ -207,7 +232,7 @@ def get_category_details(
             "id": sub.id,
             "name": sub.name,
             "type": "Receita" if sub.type == CategoryType.income else "Despesa",
-            "transactions": db.query(Transaction).filter(Transaction.category_id == sub.id).count(),
+            "transactions": len(sub.transactions),
             "unlink": f"/categories/{sub.id}/unlink" if sub.parent_id else None,
         }
         for sub in category.subcategories
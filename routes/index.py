@@ -1,15 +1,27 @@
 import calendar
-import json
 from collections import defaultdict
 from datetime import date, datetime
+from decimal import Decimal
 
 from fastapi import APIRouter, Body, Depends, Query, Request
 from fastapi.responses import RedirectResponse
-from sqlalchemy import and_, asc, desc, or_
+from sqlalchemy import and_, asc, desc, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from core.database import get_db
+from core import loaders
+from core.aggregates import period_bounds, period_totals
+from core.database import get_async_db, get_db
+from core.invoices import invoice_groups
 from core.models import Budget, Card, Category, Transaction
+from core.occurrences import get_user_transaction, materialize_occurrence, transactions_view
+from core.periods import (
+    FIRST_DAY_OF_MONTH,
+    LAST_DAY_OF_MONTH,
+    get_period_range,
+    nominal_month,
+    shift_month,
+)
 from core.schemas import CategoryType, TransactionIndexOut
 from core.templates import templates
 from core.utils import alert_error, alert_success, get_alerts
@@ -32,9 +44,6 @@ month_translation = {
 
 router = APIRouter(dependencies=[Depends(get_current_user)])
 
-FIRST_DAY_OF_MONTH = 20
-LAST_DAY_OF_MONTH = 19
-
 
 # Adiciona a função progress_color aos globals do Jinja para que ela fique disponível nos templates.
 def progress_color(progress: float) -> str:
@@ -64,195 +73,146 @@ def progress_color(progress: float) -> str:
 templates.env.globals["progress_color"] = progress_color
 
 
-def shift_month(year: int, month: int, delta: int):
-    new_month = month + delta
-    new_year = year
-    if new_month < 1:
-        new_month += 12
-        new_year -= 1
-    elif new_month > 12:
-        new_month -= 12
-        new_year += 1
-    return new_year, new_month
-
-
-def get_period_range(year: int, month: int):
-    if FIRST_DAY_OF_MONTH > LAST_DAY_OF_MONTH:
-        prev_year, prev_month = shift_month(year, month, -1)
-        _, last_day = calendar.monthrange(prev_year, prev_month)
-        start_date = date(
-            prev_year,
-            prev_month,
-            FIRST_DAY_OF_MONTH if FIRST_DAY_OF_MONTH <= last_day else last_day,
-        )
-    else:
-        _, last_day = calendar.monthrange(year, month)
-        start_date = date(
-            year, month, FIRST_DAY_OF_MONTH if FIRST_DAY_OF_MONTH <= last_day else last_day
+def transaction_index_out(t) -> TransactionIndexOut:
+    return TransactionIndexOut(
+        id=t.id,
+        category_name=t.category.name,
+        category_type=t.category.type,
+        category_icon=t.category.icon,
+        category_color=t.category.color,
+        description=t.description,
+        value=t.value,
+        due_at=t.due_at,
+        paid_at=t.paid_at,
+        is_card_invoice=False,
+        transactions=None,
+    )
+
+
+def month_label(day: date) -> str:
+    """Nome do mês em português no formato "Mês/Ano"."""
+    return f"{month_translation[day.strftime('%B')]}/{day.year}"
+
+
+def invoice_index_out(invoice, members_by_id: dict) -> TransactionIndexOut:
+    """Item de fatura do dashboard a partir de uma linha de `invoice_groups`."""
+    return TransactionIndexOut(
+        category_name="Fatura",
+        category_type="expense",
+        category_icon="fas fa-credit-card",
+        category_color="#FF5722",
+        description=f"Fatura {invoice.card_name} - {month_label(invoice.due_at)}",
+        value=invoice.total,
+        due_at=invoice.due_at,
+        close_at=invoice.close_at,
+        paid_at=invoice.paid_at,
+        is_card_invoice=True,
+        transactions=[
+            transaction_index_out(members_by_id[transaction_id]).model_dump(mode="json")
+            for transaction_id in invoice.transaction_ids
+            if transaction_id in members_by_id
+        ],
+    )
+
+
+async def invoice_segment(db: AsyncSession, condition, entity=Transaction):
+    """Faturas das transações que atendem `condition`: (quantidade, busca de uma fatia)."""
+    groups = invoice_groups(condition, entity=entity)
+    count = await db.scalar(select(func.count()).select_from(groups.order_by(None).subquery()))
+
+    async def fetch(offset: int, limit: int):
+        invoices = (await db.execute(groups.offset(offset).limit(limit))).all()
+        # Detalhes apenas das faturas da página
+        member_ids = [i for invoice in invoices for i in invoice.transaction_ids]
+        members = await db.scalars(
+            select(entity)
+            .join(Category, entity.category_id == Category.id)
+            .options(*loaders.transaction_index(entity))
+            .where(entity.id.in_(member_ids))
         )
+        members_by_id = {t.id: t for t in members}
+        return [invoice_index_out(invoice, members_by_id) for invoice in invoices]
 
-    _, last_day = calendar.monthrange(year, month)
-    end_date = date(year, month, LAST_DAY_OF_MONTH if LAST_DAY_OF_MONTH <= last_day else last_day)
-    return start_date, end_date
-
-
-def convert_index_transactions(transactions):
-    cards = {}
-    remake_transactions = []
-    for t in transactions:
-        if t.card_id:
-            if t.card_id not in cards:
-                cards[t.card_id] = {
-                    "card_id": t.card_id,
-                    "card_name": t.card.name,
-                    "card_brand": t.card.brand,
-                    "card_due_day": t.card.due_day,
-                    "card_close_day": t.card.close_day,
-                    "transactions": [],
-                }
-            cards[t.card_id]["transactions"].append(
-                TransactionIndexOut(
-                    id=t.id,
-                    category_name=t.category.name,
-                    category_type=t.category.type,
-                    category_icon=t.category.icon,
-                    category_color=t.category.color,
-                    description=t.description,
-                    value=t.value,
-                    due_at=t.due_at,
-                    paid_at=t.paid_at,
-                    is_card_invoice=False,
-                    transactions=None,
-                )
-            )
-        else:
-            remake_transactions.append(
-                TransactionIndexOut(
-                    id=t.id,
-                    category_name=t.category.name,
-                    category_type=t.category.type,
-                    category_icon=t.category.icon,
-                    category_color=t.category.color,
-                    description=t.description,
-                    value=t.value,
-                    due_at=t.due_at,
-                    paid_at=t.paid_at,
-                    is_card_invoice=False,
-                    transactions=None,
-                )
-            )
-    card_invoices = []
-
-    for card in cards.values():
-        card["transactions"] = sorted(card["transactions"], key=lambda t: t.due_at)
-        tmp_card_invoices = {}
-        for card_transaction in card["transactions"]:
-            month_card = card_transaction.due_at.month
-            year_card = card_transaction.due_at.year
-            if card_transaction.due_at.day >= card["card_close_day"]:
-                year_card, month_card = shift_month(
-                    card_transaction.due_at.year, card_transaction.due_at.month, 1
-                )
+    return count, fetch
 
-            _, last_day = calendar.monthrange(year_card, month_card)
-            due_at = date(
-                year_card,
-                month_card,
-                card["card_due_day"] if card["card_due_day"] <= last_day else last_day,
-            )
-            close_at = date(
-                year_card,
-                month_card,
-                card["card_close_day"] if card["card_close_day"] <= last_day else last_day,
-            )
-            month_card_name = due_at.strftime("%B/%Y").title()
-            month_card_name = month_card_name.replace(
-                month_card_name.split("/")[0], month_translation[month_card_name.split("/")[0]]
-            )
 
-            if card_transaction.paid_at:
-                if month_card_name + "-paid" not in tmp_card_invoices:
-                    tmp_card_invoices[month_card_name + "-paid"] = TransactionIndexOut(
-                        category_name="Fatura",
-                        category_type="expense",
-                        category_icon="fas fa-credit-card",
-                        category_color="#FF5722",
-                        description=f"Fatura {card['card_name']} - {month_card_name}",
-                        value=card_transaction.value,
-                        due_at=due_at,
-                        close_at=close_at,
-                        paid_at=card_transaction.paid_at,
-                        is_card_invoice=True,
-                        transactions=[json.loads(card_transaction.model_dump_json())],
-                    )
-                else:
-                    if card_transaction.category_type == CategoryType.expense:
-                        tmp_card_invoices[month_card_name + "-paid"].value += card_transaction.value
-                    else:
-                        tmp_card_invoices[month_card_name + "-paid"].value -= card_transaction.value
-                    tmp_card_invoices[month_card_name + "-paid"].transactions.append(
-                        json.loads(card_transaction.model_dump_json())
-                    )
-            else:
-                if month_card_name not in tmp_card_invoices:
-                    tmp_card_invoices[month_card_name] = TransactionIndexOut(
-                        category_name="Fatura",
-                        category_type="expense",
-                        category_icon="fas fa-credit-card",
-                        category_color="#FF5722",
-                        description=f"Fatura {card['card_name']} - {month_card_name}",
-                        value=card_transaction.value,
-                        due_at=due_at,
-                        close_at=close_at,
-                        paid_at=None,
-                        is_card_invoice=True,
-                        transactions=[json.loads(card_transaction.model_dump_json())],
-                    )
-                else:
-                    if card_transaction.category_type == CategoryType.expense:
-                        tmp_card_invoices[month_card_name].value += card_transaction.value
-                    else:
-                        tmp_card_invoices[month_card_name].value -= card_transaction.value
-                    tmp_card_invoices[month_card_name].transactions.append(
-                        json.loads(card_transaction.model_dump_json())
-                    )
-        card_invoices += list(tmp_card_invoices.values())
-    return card_invoices + remake_transactions
+async def transaction_segment(db: AsyncSession, condition, *order_by, entity=Transaction):
+    """Transações sem cartão que atendem `condition`: (quantidade, busca de uma fatia)."""
+    conditions = [condition, entity.card_id.is_(None)]
+    count = await db.scalar(
+        select(func.count())
+        .select_from(entity)
+        .join(Category, entity.category_id == Category.id)
+        .where(*conditions)
+    )
 
+    async def fetch(offset: int, limit: int):
+        transactions = await db.scalars(
+            select(entity)
+            .join(Category, entity.category_id == Category.id)
+            .options(*loaders.transaction_index(entity))
+            .where(*conditions)
+            .order_by(*order_by)
+            .offset(offset)
+            .limit(limit)
+        )
+        return [transaction_index_out(t) for t in transactions]
 
-def make_pagination(transacoes, page, per_page):
-    """
-    Retorna uma fatia da lista `transacoes` de acordo com a paginação especificada.
+    return count, fetch
 
-    Args:
-        transacoes (list): Lista de transações a serem paginadas.
-        page (int): Número da página (deve ser maior que 0).
-        per_page (int): Número de itens por página (deve ser maior que 0).
 
-    Returns:
-        list: Sublista contendo os itens da página solicitada.
-    """
-    # Garantir que transacoes é uma lista ou estrutura indexável
-    if not isinstance(transacoes, (list, tuple)):
-        raise ValueError("O parâmetro 'transacoes' deve ser uma lista ou tupla.")
+def pending_totals_query(user_id: int, pending_window, entity=Transaction):
+    """Soma das pendentes do período por categoria, tipo e conta/cartão."""
+    on_card = entity.card_id.isnot(None)
+    return (
+        select(
+            entity.category_id,
+            Category.type,
+            on_card.label("on_card"),
+            func.sum(entity.value).label("total"),
+        )
+        .join(Category, entity.category_id == Category.id)
+        .where(entity.user_id == user_id, entity.paid_at.is_(None))
+        .where(Category.type.not_in([CategoryType.invoice, CategoryType.transfer]))
+        .where(pending_window)
+        .group_by(entity.category_id, Category.type, on_card)
+    )
 
-    # Garantir que page e per_page são inteiros positivos
-    if not isinstance(page, int) or not isinstance(per_page, int):
-        raise ValueError("Os parâmetros 'page' e 'per_page' devem ser números inteiros.")
-    if page < 1 or per_page < 1:
-        return []  # Retorna lista vazia para entradas inválidas
 
-    start = (page - 1) * per_page
-    end = start + per_page
+def add_totals(rows, totals: dict, by_category: dict):
+    """Acumula linhas (categoria, tipo, no cartão, total) nos totais por tipo e por categoria."""
+    for category_id, category_type, on_card, total in rows:
+        totals[(category_type, on_card)] += total
+        by_category[category_id] += total
 
-    # Evita erro de índice fora do limite
-    return transacoes[start:end] if start < len(transacoes) else []
+
+async def paginate_segments(segments, page: int, per_page: int):
+    """Pagina uma lista formada por segmentos consecutivos de (quantidade, busca).
+
+    Retorna os itens da página e o total. Só os segmentos que cobrem a página são buscados,
+    cada um com OFFSET/LIMIT no banco.
+    """
+    total = sum(count for count, _ in segments)
+    if page < 1 or per_page < 1:
+        return [], total
+
+    items = []
+    offset = (page - 1) * per_page
+    for count, fetch in segments:
+        if len(items) >= per_page:
+            break
+        if offset >= count:
+            offset -= count
+            continue
+        items += await fetch(offset, per_page - len(items))
+        offset = 0
+    return items, total
 
 
 @router.get("/")
-def get_index(
+async def get_index(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_current_user),
     year: int = Query(None),
     month: int = Query(None),
@@ -264,11 +224,7 @@ def get_index(
 ):
     # Determina o "mês nominal" se não forem passados year e month
     if not year or not month:
-        today = date.today()
-        year, month = today.year, today.month
-        if FIRST_DAY_OF_MONTH > LAST_DAY_OF_MONTH:
-            if today.day >= FIRST_DAY_OF_MONTH:
-                year, month = shift_month(year, month, 1)
+        year, month = nominal_month(date.today())
 
     start_date, end_date = get_period_range(year, month)
 
@@ -280,14 +236,9 @@ def get_index(
     prev_year, prev_month = shift_month(year, month, -1)
     next_year, next_month = shift_month(year, month, 1)
 
-    cards = db.query(Card).filter(Card.user_id == user.id).all()
-    query_or = [
-        and_(
-            Transaction.card_id.is_(None),
-            Transaction.due_at >= start_date,
-            Transaction.due_at <= end_date,
-        )
-    ]
+    cards = (await db.scalars(select(Card).where(Card.user_id == user.id))).all()
+    # Janelas de vencimento: o mês para contas e a fatura do mês para cada cartão
+    windows = [(None, start_date, end_date)]
     for card in cards:
         if FIRST_DAY_OF_MONTH > LAST_DAY_OF_MONTH:
             if card.due_day < FIRST_DAY_OF_MONTH:
@@ -311,107 +262,120 @@ def get_index(
             invoice_end_date = date(year_card_end, month_card_end, close_invoice)
         else:
             invoice_end_date = date(year_card, month_card, last_day)
-        query_or.append(
+        windows.append((card.id, invoice_start_date, invoice_end_date))
+
+    # Transações do usuário com as ocorrências virtuais de recorrências que vencem nas janelas
+    view = transactions_view(
+        user.id, min(start for _, start, _ in windows), max(end for _, _, end in windows)
+    )
+    pending_window = or_(
+        *(
             and_(
-                Transaction.card_id == card.id,
-                Transaction.due_at >= invoice_start_date,
-                Transaction.due_at <= invoice_end_date,
+                view.card_id.is_(None) if card_id is None else view.card_id == card_id,
+                view.due_at >= start,
+                view.due_at <= end,
             )
+            for card_id, start, end in windows
         )
-    # Transações Efetuadas (pagas) com paginação
-    paid_query = (
-        db.query(Transaction)
-        .join(Category, Transaction.category_id == Category.id)
-        .filter(Transaction.user_id == user.id)
-        .filter(Category.type.not_in([CategoryType.invoice, CategoryType.transfer]))
-        .filter(Transaction.paid_at.isnot(None))
-        .filter(Transaction.paid_at >= start_date, Transaction.paid_at <= end_date)
-        .order_by(desc(Transaction.paid_at), desc(Transaction.updated_at))
     )
-    print("start_date", start_date)
-    print("end_date", end_date)
-
-    transacoes_efetuada_all = paid_query.all()
-    print("transacoes_efetuada_all", [t.description for t in transacoes_efetuada_all if t.category.type == "income"])
 
-    if is_preview:
-        pending_query = (
-            db.query(Transaction)
-            .join(Category, Transaction.category_id == Category.id)
-            .filter(Transaction.user_id == user.id)
-            .filter(Transaction.paid_at.is_(None))
-            .filter(Category.type.not_in([CategoryType.invoice, CategoryType.transfer]))
-            .filter(or_(*query_or))
-            .order_by(asc(Transaction.due_at))
-        )
-        transacoes_efetuada_all += pending_query.all()
-
-    transacoes_efetuadas = convert_index_transactions(transacoes_efetuada_all)
-    total_paid = len(transacoes_efetuadas)
-    transacoes_efetuadas = make_pagination(transacoes_efetuadas, paid_page, paid_per_page)
-
-    # Transações Pendentes com paginação
-    pending_query = (
-        db.query(Transaction)
-        .join(Category, Transaction.category_id == Category.id)
-        .filter(Transaction.user_id == user.id)
-        .filter(Transaction.paid_at.is_(None))
-        .filter(Category.type.not_in([CategoryType.invoice, CategoryType.transfer]))
-        .filter(or_(*query_or))
-        .order_by(asc(Transaction.due_at))
+    # Transações Efetuadas (pagas no período) e Pendentes (vencendo no período/fatura)
+    month_date = date(year, month, 1)
+    paid_start, paid_end = period_bounds(month_date)
+    visible_types = Category.type.not_in([CategoryType.invoice, CategoryType.transfer])
+    paid_condition = and_(
+        view.user_id == user.id,
+        visible_types,
+        view.paid_at.isnot(None),
+        view.paid_at >= paid_start,
+        view.paid_at < paid_end,
+    )
+    pending_condition = and_(
+        view.user_id == user.id,
+        view.paid_at.is_(None),
+        visible_types,
+        pending_window,
+    )
+    paid_order = (desc(view.paid_at), desc(view.updated_at), desc(view.id))
+    pending_order = (asc(view.due_at), asc(view.id))
+
+    # Resumos: totais pagos dos agregados mensais e pendentes somados no banco; aqui só são
+    # combinadas as linhas já agrupadas por (categoria, tipo, no cartão)
+    paid_totals = defaultdict(Decimal)  # (tipo da categoria, no cartão) -> total
+    spent_by_category = defaultdict(Decimal)
+    add_totals(
+        await db.execute(period_totals(user.id, month_date)), paid_totals, spent_by_category
+    )
+    pending_totals = defaultdict(Decimal)
+    pending_by_category = defaultdict(Decimal)
+    add_totals(
+        await db.execute(pending_totals_query(user.id, pending_window, view)),
+        pending_totals,
+        pending_by_category,
     )
 
-    transacoes_pendente_all = pending_query.all()
+    # Listas paginadas no banco: faturas primeiro (cada uma conta como um item), depois as
+    # transações sem cartão
     if is_preview:
-        transacoes_pendente_all = []
-    transacoes_pendentes = convert_index_transactions(transacoes_pendente_all)
-    total_pending = len(transacoes_pendentes)
-    transacoes_pendentes = make_pagination(transacoes_pendentes, pending_page, pending_per_page)
-
-    # Resumos
-    entrou = sum(
-        t.value
-        for t in transacoes_efetuada_all
-        if t.category.type == CategoryType.income and t.card_id is None
+        # Na prévia as pendentes entram nos resumos e na lista como se estivessem pagas
+        for key, value in pending_totals.items():
+            paid_totals[key] += value
+        for category_id, value in pending_by_category.items():
+            spent_by_category[category_id] += value
+        pending_totals.clear()
+        paid_segments = [
+            await invoice_segment(db, or_(paid_condition, pending_condition), view),
+            await transaction_segment(db, paid_condition, *paid_order, entity=view),
+            await transaction_segment(db, pending_condition, *pending_order, entity=view),
+        ]
+        pending_segments = []
+    else:
+        paid_segments = [
+            await invoice_segment(db, paid_condition, view),
+            await transaction_segment(db, paid_condition, *paid_order, entity=view),
+        ]
+        pending_segments = [
+            await invoice_segment(db, pending_condition, view),
+            await transaction_segment(db, pending_condition, *pending_order, entity=view),
+        ]
+    transacoes_efetuadas, total_paid = await paginate_segments(
+        paid_segments, paid_page, paid_per_page
     )
-    saiu = sum(t.value for t in transacoes_efetuada_all if t.category.type == CategoryType.expense)
-    credito_cartao = sum(
-        t.value
-        for t in transacoes_efetuada_all
-        if t.category.type == CategoryType.income and t.card_id is not None
+    transacoes_pendentes, total_pending = await paginate_segments(
+        pending_segments, pending_page, pending_per_page
     )
-    saiu = saiu - credito_cartao
-    sobrou = entrou - saiu
 
-    entrou_preview = (
-        sum(
-            t.value
-            for t in transacoes_pendente_all
-            if t.category.type == CategoryType.income and t.card_id is None
-        )
-        + entrou
+    entrou = paid_totals[(CategoryType.income, False)]
+    credito_cartao = paid_totals[(CategoryType.income, True)]
+    saiu = (
+        paid_totals[(CategoryType.expense, False)]
+        + paid_totals[(CategoryType.expense, True)]
+        - credito_cartao
     )
+    sobrou = entrou - saiu
+
+    entrou_preview = pending_totals[(CategoryType.income, False)] + entrou
     saiu_preview = (
-        sum(t.value for t in transacoes_pendente_all if t.category.type == CategoryType.expense)
+        pending_totals[(CategoryType.expense, False)]
+        + pending_totals[(CategoryType.expense, True)]
         + saiu
     )
     sobrou_preview = entrou_preview - saiu_preview
 
     # Orçamentos do "mês nominal"
-    month_date = date(year, month, 1)
-    budgets = db.query(Budget).filter(Budget.user_id == user.id, Budget.month == month_date).all()
-    categories = (
-        db.query(Category)
-        .filter(Category.user_id == user.id, Category.type == CategoryType.expense)
-        .all()
-    )
+    budgets = (
+        await db.scalars(
+            select(Budget).where(Budget.user_id == user.id, Budget.month == month_date)
+        )
+    ).all()
+    # Carrega todas as categorias do usuário de uma vez (sem lazy load no modo assíncrono)
+    categories_by_id = {
+        c.id: c for c in (await db.scalars(select(Category).where(Category.user_id == user.id)))
+    }
+    categories = [c for c in categories_by_id.values() if c.type == CategoryType.expense]
     total_budget = sum(b.limit_value for b in budgets)
     total_spent = sum(
-        [
-            t.value
-            for t in transacoes_efetuada_all
-            if t.category_id in [b.category_id for b in budgets]
-        ]
+        spent_by_category.get(category_id, 0) for category_id in {b.category_id for b in budgets}
     )
     orcamento_percent = 0
     if total_budget > 0:
@@ -419,16 +383,13 @@ def get_index(
 
     # Agrupar orçamentos por categoria pai (apenas categorias pais com orçamento, ou cujas subcategorias possuam orçamento)
     def get_root_category(cat: Category):
-        while cat.parent is not None:
-            cat = cat.parent
-        return cat
+        return categories_by_id.get(cat.root_id, cat)
 
     parent_map = defaultdict(lambda: {"cat": None, "budgets": []})
     for b in budgets:
-        cat = b.category
+        cat = categories_by_id[b.category_id]
         root = get_root_category(cat)
-        spent_val = sum([t.value for t in transacoes_efetuada_all if t.category_id == cat.id])
-        spent_val = float(spent_val or 0.0)
+        spent_val = float(spent_by_category.get(cat.id, 0))
         item_info = {
             "budget_id": b.id,
             "cat_id": cat.id,
@@ -463,13 +424,13 @@ def get_index(
             "bar_color": progress_color(progress),
         }
 
+    budget_category_ids = {b.category_id for b in budgets}
     for cat in categories:
-        if cat.id not in [b.category_id for b in budgets]:
-            spent_val = sum([t.value for t in transacoes_efetuada_all if t.category_id == cat.id])
-            spent_val = float(spent_val or 0.0)
+        if cat.id not in budget_category_ids:
+            spent_val = float(spent_by_category.get(cat.id, 0))
             if spent_val > 0:
                 root_cat = get_root_category(cat)
-                if root_cat.id not in list(budgets_parent_info.keys()):
+                if root_cat.id not in budgets_parent_info:
                     budgets_parent_info[root_cat.id] = {
                         "root_id": root_cat.id,
                         "root_name": root_cat.name,
@@ -547,8 +508,12 @@ def registry_payment(
     if len(transaction_id.split(",")) > 1:
         # invoice
         transaction_ids = [int(x) for x in transaction_id.split(",")]
+        # Ocorrências virtuais da fatura são gravadas antes do pagamento
+        occurrences = [materialize_occurrence(db, user.id, i) for i in transaction_ids if i < 0]
+        transaction_ids = [i for i in transaction_ids if i > 0] + [o.id for o in occurrences if o]
         transactions = (
             db.query(Transaction)
+            .options(*loaders.transaction_payment())
             .filter(Transaction.id.in_(transaction_ids), Transaction.user_id == user.id)
             .all()
         )
@@ -556,8 +521,6 @@ def registry_payment(
         total_value = sum(
             t.value if t.category.type == CategoryType.expense else -t.value for t in transactions
         )
-        print(float(total_value))
-        print(float(value))
         if float(total_value) != float(value):
             card = db.query(Card).filter(Card.id == transactions[0].card_id).first()
             ajust_value = float(total_value) - float(value)
@@ -576,8 +539,6 @@ def registry_payment(
                     .first()
                 )
             ajust_value = abs(ajust_value)
-            print("cartegory.name", cartegory.name)
-            print("ajust_value", ajust_value)
 
             # create ajust transaction
             transaction = Transaction(
@@ -596,11 +557,7 @@ def registry_payment(
             t.paid_at = payment_date
         db.commit()
     else:
-        transaction = (
-            db.query(Transaction)
-            .filter(Transaction.id == transaction_id, Transaction.user_id == user.id)
-            .first()
-        )
+        transaction = get_user_transaction(db, user.id, int(transaction_id), materialize=True)
         if not transaction:
             alert_error(request, "Transação não encontrada")
             return RedirectResponse(url="/", status_code=303)
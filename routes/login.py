@@ -3,18 +3,18 @@ from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, Form, Request
 from fastapi.responses import RedirectResponse
 from jose import jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.database import get_db
+from core.database import get_async_db
 from core.models import User
+from core.passwords import password_hasher
 from core.settings import ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, SECRET_KEY
 from core.templates import templates
+from core.tokens import session_claims
 
 router = APIRouter()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -34,22 +34,24 @@ def get_login(request: Request):
 
 
 @router.post("/login")
-def post_login(
+async def post_login(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     username: str = Form(...),
     password: str = Form(...),
 ):
     """Processa o login do usuário."""
-    user = db.query(User).filter(User.username == username).first()
+    user = await db.scalar(select(User).where(User.username == username))
 
-    if not user or not pwd_context.verify(password, user.password):
+    if not user or not await password_hasher.verify(password, user.password):
         return templates.TemplateResponse(
             "pages/login.html", {"request": request, "error": "Usuário ou senha inválidos"}
         )
 
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(data={"sub": user.email}, expires_delta=access_token_expires)
+    access_token = create_access_token(
+        data=session_claims(user), expires_delta=access_token_expires
+    )
     # fazer um SetCookie com o access_token
     response = RedirectResponse(url="/", status_code=303)
     response.set_cookie(
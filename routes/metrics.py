@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends
+
+from core.cache import get_cache_metrics
+from core.database import get_pool_metrics
+from core.passwords import password_hasher
+from routes.auth import get_current_user
+
+router = APIRouter(dependencies=[Depends(get_current_user)])
+
+
+@router.get("/metrics/database")
+def get_database_metrics():
+    """Retorna as métricas dos pools de conexão, dos caches em memória e do pool de bcrypt."""
+    return {
+        "pools": get_pool_metrics(),
+        "caches": get_cache_metrics(),
+        "password_hashing": password_hasher.snapshot(),
+    }
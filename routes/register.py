@@ -1,17 +1,16 @@
 from fastapi import APIRouter, Depends, Form, Request
 from fastapi.responses import RedirectResponse
-from passlib.context import CryptContext
 from pydantic import EmailStr
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.database import get_db
+from core.database import get_async_db
 from core.models import User
+from core.passwords import password_hasher
 from core.templates import templates
 
 router = APIRouter()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 
 @router.get("/register")
 def get_register(request: Request):
@@ -20,24 +19,24 @@ def get_register(request: Request):
 
 
 @router.post("/register")
-def post_register(
+async def post_register(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     name: str = Form(...),
     email: EmailStr = Form(...),
     password: str = Form(...),
 ):
     """Processa o cadastro do usuário."""
-    existing_user = db.query(User).filter(User.email == email).first()
+    existing_user = await db.scalar(select(User).where(User.email == email))
 
     if existing_user:
         return templates.TemplateResponse(
             "register.html", {"request": request, "error": "E-mail já cadastrado"}
         )
 
-    hashed_password = pwd_context.hash(password)
+    hashed_password = await password_hasher.hash(password)
     new_user = User(name=name, email=email, password=hashed_password)
     db.add(new_user)
-    db.commit()
+    await db.commit()
 
     return RedirectResponse(url="/login", status_code=303)
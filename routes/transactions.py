@@ -1,4 +1,3 @@
-import calendar
 import io
 from datetime import date, datetime, timedelta
 
@@ -8,11 +7,25 @@ from fastapi.responses import RedirectResponse, StreamingResponse
 from openpyxl.styles import NamedStyle
 from openpyxl.utils import quote_sheetname
 from openpyxl.worksheet.datavalidation import DataValidation
-from sqlalchemy import asc, desc
+from sqlalchemy import desc, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from core.database import get_db
+from core import loaders
+from core.database import get_async_db, get_db
+from core.listing import ListQuery
 from core.models import Account, Card, Category, Transaction
+from core.occurrences import (
+    FREQUENCIES,
+    end_series,
+    get_user_transaction,
+    next_occurrence_date,
+    skip_occurrence,
+    transactions_view,
+)
+from core.periods import add_months
+from core.reference import areference_data, combobox_options
+from core.rollover import recurrence_horizon
 from core.schemas import (
     CategoryType,
     Column,
@@ -23,6 +36,25 @@ from core.schemas import (
     TemplateContext,
     UploadSchema,
 )
+from core.search import text_search_rank
+from core.series import (
+    delete_following,
+    insert_chain,
+    insert_series,
+    renumber_preceding,
+    save_series,
+    strip_installment_prefix,
+    update_preceding,
+)
+from core.settings import RECURRING_VIRTUAL, UPLOAD_BATCH_SIZE
+from core.spreadsheets import (
+    batched,
+    cell_date,
+    cell_datetime,
+    is_blank,
+    iter_sheet_rows,
+    spooled_upload,
+)
 from core.templates import templates
 from core.utils import alert_error, alert_success
 from routes.auth import get_current_user
@@ -40,22 +72,10 @@ from core.database import get_db
 from core.models import Account, Card, Category
 
 
-def add_months(source_date, months):
-    month = source_date.month - 1 + months
-    year = source_date.year + (month // 12)
-    month = (month % 12) + 1
-    day = source_date.day
-    try:
-        return source_date.replace(year=year, month=month, day=day)
-    except ValueError:
-        last_day = calendar.monthrange(year, month)[1]
-        return source_date.replace(year=year, month=month, day=last_day)
-
-
 @router.get("/transactions")
-def get_transactions(
+async def get_transactions(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_current_user),
     page: int = Query(1),
     per_page: int = Query(10),
@@ -63,6 +83,7 @@ def get_transactions(
     sort_order: str = Query("asc"),
     situation: str = Query(None, alias="f_situation"),
     description: str = Query(None, alias="f_description"),
+    description_rank: str = Query(None, alias="f_description_rank"),
     account_id: int | str = Query(None, alias="f_account_id"),
     card_id: int | str = Query(None, alias="f_card_id"),
     category_id: int | str = Query(None, alias="f_category_id"),
@@ -72,75 +93,69 @@ def get_transactions(
     paid_at_end: str = Query(None, alias="f_paid_at_end"),
     category_type: str = Query(None, alias="f_category_type"),
     transaction_type: str = Query(None, alias="f_transaction_type"),
+    cursor: str = Query(None),
+    rows_only: bool = Query(False),
 ):
+    # Ocorrências virtuais de recorrências entram até o fim do filtro de vencimento (ou até o
+    # horizonte das recorrências materializadas)
+    view = transactions_view(
+        user.id,
+        date.fromisoformat(due_at_start) if due_at_start else None,
+        date.fromisoformat(due_at_end) if due_at_end else recurrence_horizon(),
+    )
     # Base query com joins para poder ordenar por campos relacionados
     query = (
-        db.query(Transaction)
-        .join(Account, Transaction.account_id == Account.id)
-        .join(Category, Transaction.category_id == Category.id)
-        .outerjoin(Card, Transaction.card_id == Card.id)
-        .filter(Transaction.user_id == user.id)
+        select(view)
+        .join(Account, view.account_id == Account.id)
+        .join(Category, view.category_id == Category.id)
+        .outerjoin(Card, view.card_id == Card.id)
+        .options(*loaders.transaction_grid(view))
+        .where(view.user_id == user.id)
     )
-    if situation:
-        if situation == "1":
-            query = query.filter(Transaction.paid_at.isnot(None))
-        elif situation == "2":
-            query = query.filter(Transaction.paid_at.is_(None))
-    if description:
-        query = query.filter(Transaction.description.ilike(f"%{description}%"))
-    if account_id:
-        query = query.filter(Transaction.account_id == account_id)
-    if card_id:
-        if card_id == "none":
-            query = query.filter(Transaction.card_id.is_(None))
-        else:
-            query = query.filter(Transaction.card_id == card_id)
-    if category_id:
-        query = query.filter(Transaction.category_id == category_id)
-    if category_type:
-        query = query.filter(Category.type == category_type)
-    if due_at_start or due_at_end:
-        if due_at_start:
-            start_date = date.fromisoformat(due_at_start)
-            query = query.filter(Transaction.due_at >= start_date)
-        if due_at_end:
-            end_date = date.fromisoformat(due_at_end)
-            query = query.filter(Transaction.due_at <= end_date)
-    if paid_at_start or paid_at_end:
-        if paid_at_start:
-            start_date = datetime.fromisoformat(paid_at_start)
-            query = query.filter(Transaction.paid_at >= start_date)
-        if paid_at_end:
-            end_date = datetime.fromisoformat(paid_at_end)
-            query = query.filter(Transaction.paid_at <= end_date)
-    if transaction_type:
-        if transaction_type == "recurring":
-            query = query.filter(Transaction.is_recurring.is_(True))
-        elif transaction_type == "installment":
-            query = query.filter(Transaction.installments.isnot(None))
-        elif transaction_type == "none":
-            query = query.filter(
-                Transaction.is_recurring.is_(False), Transaction.installments.is_(None)
-            )
-
     sort_map = {
-        "id": Transaction.id,
+        "id": view.id,
         "account": Account.name,
         "category": Category.name,
         "card": Card.name,
-        "description": Transaction.description,
-        "value": Transaction.value,
-        "due_at": Transaction.due_at,
-        "paid_at": Transaction.paid_at,
+        "description": view.description,
+        "value": view.value,
+        "due_at": view.due_at,
+        "paid_at": view.paid_at,
     }
-    sort_column = sort_map.get(sort_by, Transaction.id)
-    if sort_order.lower() == "desc":
-        query = query.order_by(desc(sort_column))
+    list_query = ListQuery(query, view.id, sort_map)
+
+    if situation == "1":
+        list_query.where(view.paid_at.isnot(None))
+    elif situation == "2":
+        list_query.where(view.paid_at.is_(None))
+    list_query.filter_contains(view.description, description)
+    list_query.filter_equals(view.account_id, account_id, int)
+    if card_id == "none":
+        list_query.where(view.card_id.is_(None))
     else:
-        query = query.order_by(asc(sort_column))
-
-    total_count = query.count()
-    transactions = query.offset((page - 1) * per_page).limit(per_page).all()
+        list_query.filter_equals(view.card_id, card_id, int)
+    list_query.filter_equals(view.category_id, category_id, int)
+    list_query.filter_equals(Category.type, category_type, CategoryType)
+    list_query.filter_range(view.due_at, due_at_start, due_at_end, date.fromisoformat)
+    list_query.filter_range(view.paid_at, paid_at_start, paid_at_end, datetime.fromisoformat)
+    if transaction_type == "recurring":
+        list_query.where(view.is_recurring.is_(True))
+    elif transaction_type == "installment":
+        list_query.where(view.installments.isnot(None))
+    elif transaction_type == "none":
+        list_query.where(view.is_recurring.is_(False), view.installments.is_(None))
+
+    # Ordena primeiro pela relevância da descrição, quando solicitado e suportado
+    if description and description_rank == "1":
+        rank = text_search_rank(view.description, description, db.get_bind().dialect.name)
+        if rank is not None:
+            list_query.order_first_by(desc(rank))
+    list_query.order(sort_by, sort_order)
+
+    # Página + total em uma única consulta; com `cursor`, a página seguinte via keyset
+    transactions, total_count, next_cursor = await list_query.afetch(db, page, per_page, cursor)
+    if total_count is None:
+        total_count = 0 if rows_only else await db.scalar(list_query.count_statement())
 
     columns = [
         Column(label="ID", type="number", sort=True, sort_key="id"),
@@ -182,22 +197,22 @@ def get_transactions(
             ]
         )
 
-    # Schemas para CRUD e filtros
-    account_options = [
-        ComboboxOption(value=acc.id, label=acc.name).model_dump()
-        for acc in db.query(Account).filter(Account.user_id == user.id).all()
-    ]
+    permissions = Permissions(add=True, edit=True, delete=True, upload=True, filter=True)
 
-    category_options = [
-        ComboboxOption(
-            value=cat.id, label=cat.name if not cat.parent_id else f"{cat.parent.name} > {cat.name}"
-        ).model_dump()
-        for cat in db.query(Category).filter(Category.user_id == user.id).all()
-    ]
-    card_options = [
-        ComboboxOption(value=c.id, label=c.name).model_dump()
-        for c in db.query(Card).filter(Card.user_id == user.id).all()
-    ]
+    if rows_only:
+        # "Carregar mais" do datagrid: apenas as linhas e o cursor da página seguinte
+        return templates.TemplateResponse(
+            "components/datagrid_rows.html",
+            {"request": request, "columns": columns, "values": values, "permissions": permissions},
+            headers={"X-Next-Cursor": next_cursor or ""},
+        )
+
+    # Schemas para CRUD e filtros
+    account_options = combobox_options(await areference_data(db, user.id, "accounts"))
+    category_options = combobox_options(
+        await areference_data(db, user.id, "categories"), label="full_name"
+    )
+    card_options = combobox_options(await areference_data(db, user.id, "cards"))
 
     crud_schema = [
         CrudField(
@@ -293,6 +308,12 @@ def get_transactions(
 
     filter_schema = [
         FilterField(name="description", label="Descrição", type="text"),
+        FilterField(
+            name="description_rank",
+            label="Ordenar por Relevância",
+            type="combobox",
+            options=[ComboboxOption(value="1", label="Sim")],
+        ),
         FilterField(
             name="situation",
             label="Situação",
@@ -354,8 +375,6 @@ def get_transactions(
         pre_fields=None,
     )
 
-    permissions = Permissions(add=True, edit=True, delete=True, upload=True, filter=True)
-
     context = TemplateContext(
         request=request,
         entity="transactions",
@@ -366,6 +385,8 @@ def get_transactions(
         filter_schema=filter_schema,
         upload_schema=upload_schema,
         total_count=total_count,
+        keyset=list_query.supports_cursor,
+        next_cursor=next_cursor,
     )
     return templates.TemplateResponse("pages/transactions.html", context.model_dump())
 
@@ -380,14 +401,13 @@ def download_transactions_template(
     # Consultar dados do banco
     accounts = [a.name for a in db.query(Account).filter(Account.user_id == user.id).all()]
     cards = [c.name for c in db.query(Card).filter(Card.user_id == user.id).all()]
-    parent_categories = (
-        db.query(Category).filter(Category.user_id == user.id, Category.parent_id.is_(None)).all()
-    )
-    categories = []
-    for parent in parent_categories:
-        categories.append(parent.name.strip())
-        for sub in parent.subcategories:
-            categories.append(parent.name.strip() + " > " + sub.name.strip())
+    categories = [
+        c.full_name
+        for c in db.query(Category)
+        .filter(Category.user_id == user.id, Category.full_name.isnot(None))
+        .order_by(Category.path)
+        .all()
+    ]
 
     # Encontrar o tamanho máximo das listas
     max_len = max(len(accounts), len(cards), len(categories))
@@ -514,11 +534,7 @@ def get_transaction(
     transaction_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)
 ):
     """Retorna os dados de uma transação para edição no modal."""
-    transaction = (
-        db.query(Transaction)
-        .filter(Transaction.id == transaction_id, Transaction.user_id == user.id)
-        .first()
-    )
+    transaction = get_user_transaction(db, user.id, transaction_id)
     if not transaction:
         return {"error": "Transação não encontrada"}
     # Retorna sempre o valor absoluto, já que armazenamos como positivo.
@@ -641,11 +657,8 @@ def edit_transaction(
     referer = request.headers.get("referer")
     if referer and len(referer.split("?")) > 1:
         url_redirect = url_redirect + f"?{referer.split('?')[1]}"
-    transaction = (
-        db.query(Transaction)
-        .filter(Transaction.id == transaction_id, Transaction.user_id == user.id)
-        .first()
-    )
+    # Ocorrência virtual editada vira exceção gravada da série
+    transaction = get_user_transaction(db, user.id, transaction_id, materialize=True)
     if not transaction:
         alert_error(request, "Transação não encontrada")
         return RedirectResponse(url=url_redirect, status_code=303)
@@ -680,32 +693,26 @@ def edit_transaction(
     db.commit()
     if next_occurrences:
         if transaction.is_recurring and not is_recurring:
-            print("Deixou de ser recorrente")
             # Delete all future recurring transactions
-            cleanup_next_transactions(db, transaction.id)
+            delete_following(db, transaction)
             transaction.is_recurring = False
             transaction.recurring_frequency = None
             transaction.recurring_end_date = None
+            # A série (e as ocorrências anteriores) passa a terminar nesta data
+            update_preceding(db, transaction, recurring_end_date=transaction.due_at)
+            if transaction.series_id:
+                save_series(db, user.id, transaction.series_id, end_date=transaction.due_at)
             db.commit()
-            if transaction.parent_id:
-                parent_id = transaction.parent_id
-                while parent_id:
-                    parent_transaction = (
-                        db.query(Transaction).filter(Transaction.parent_id == parent_id).first()
-                    )
-                    if parent_transaction:
-                        parent_transaction.recurring_end_date = transaction.due_at
-                        if parent_transaction.parent_id:
-                            parent_id = parent_transaction.parent_id
-                        else:
-                            parent_id = None
-                        db.commit()
-                    else:
-                        parent_id = None
 
         elif is_recurring:
-            print("É recorrente")
-            # Create all future recurring transactions
+            # Recria as ocorrências seguintes com a nova regra, na mesma série
+            delete_following(db, transaction)
+            series_id = transaction.series_id
+            if RECURRING_VIRTUAL:
+                # As posições virtuais contam a partir do início da série: a série antiga
+                # termina antes desta ocorrência e a nova regra começa uma série nova
+                end_series(db, transaction, transaction.due_at - timedelta(days=1))
+                series_id = None
             create_transactions(
                 user,
                 db,
@@ -723,32 +730,30 @@ def edit_transaction(
                 total_installments,
                 current_installment,
                 parent_id=transaction.parent_id,
+                series_id=series_id,
+                commit=False,
             )
             # delete old transaction
             db.delete(transaction)
             db.commit()
 
         if transaction.installments and not is_installment:
-            print("Deixou de ser parcelado")
             # Delete all future installment transactions
-            cleanup_next_transactions(db, transaction.id)
-            description = description.split(") ")[1] if description.startswith("(") else description
+            delete_following(db, transaction)
+            description = strip_installment_prefix(description)
             if transaction.parent_id:
-                parent_id = transaction.parent_id
                 total_installments = transaction.current_installment - 1
-                modify_parent_transaction_info(db, description, total_installments, parent_id)
+                renumber_preceding(db, transaction, description, total_installments)
 
             db.delete(transaction)
             db.commit()
 
         elif is_installment:
-            print("É parcelado")
-            # Create all future installment transactions
-            # Create all future recurring transactions
-            description = description.split(") ")[1] if description.startswith("(") else description
+            # Recria as parcelas seguintes com o novo total, na mesma série
+            delete_following(db, transaction)
+            description = strip_installment_prefix(description)
             if transaction.parent_id:
-                parent_id = transaction.parent_id
-                modify_parent_transaction_info(db, description, total_installments, parent_id)
+                renumber_preceding(db, transaction, description, total_installments)
 
             create_transactions(
                 user,
@@ -767,6 +772,8 @@ def edit_transaction(
                 total_installments,
                 current_installment,
                 parent_id=transaction.parent_id,
+                series_id=transaction.series_id,
+                commit=False,
             )
             # delete old transaction
             db.delete(transaction)
@@ -774,23 +781,6 @@ def edit_transaction(
     return RedirectResponse(url=url_redirect, status_code=303)
 
 
-def modify_parent_transaction_info(db, description, total_installments, parent_id):
-    while parent_id:
-        parent_transaction = db.query(Transaction).filter(Transaction.id == parent_id).first()
-        if parent_transaction:
-            parent_transaction.description = (
-                f"({parent_transaction.current_installment}/{total_installments}) {description}"
-            )
-            parent_transaction.installments = total_installments
-            if parent_transaction.parent_id:
-                parent_id = parent_transaction.parent_id
-            else:
-                parent_id = None
-            db.commit()
-        else:
-            parent_id = None
-
-
 @router.post("/transactions/{transaction_id}/delete")
 def delete_transaction(
     request: Request,
@@ -805,29 +795,29 @@ def delete_transaction(
     if referer and len(referer.split("?")) > 1:
         url_redirect = url_redirect + f"?{referer.split('?')[1]}"
 
-    transaction = (
-        db.query(Transaction)
-        .filter(Transaction.id == transaction_id, Transaction.user_id == user.id)
-        .first()
-    )
+    transaction = get_user_transaction(db, user.id, transaction_id)
     if not transaction:
         alert_error(request, "Transação não encontrada")
         return RedirectResponse(url=url_redirect, status_code=303)
     try:
         if next_occurrences:
             if transaction.installments:
-                description = (
-                    transaction.description.split(") ")[1]
-                    if transaction.description.startswith("(")
-                    else transaction.description
-                )
-                total_installments = transaction.current_installment - 1
-                parent_id = transaction.parent_id
-                modify_parent_transaction_info(db, description, total_installments, parent_id)
-
-            cleanup_next_transactions(db, transaction.id)
+                description = strip_installment_prefix(transaction.description)
+                if transaction.parent_id:
+                    total_installments = transaction.current_installment - 1
+                    renumber_preceding(db, transaction, description, total_installments)
+
+            delete_following(db, transaction)
+            # A série termina antes desta ocorrência (expansão virtual e core.rollover param aqui)
+            if transaction.is_recurring:
+                end_series(db, transaction, transaction.due_at - timedelta(days=1))
+        else:
+            # Recorrência virtual: só esta posição deixa de ser gerada
+            skip_occurrence(db, transaction)
 
-        db.delete(transaction)
+        # Ocorrência virtual ainda não gravada não tem linha a excluir
+        if transaction.id is not None:
+            db.delete(transaction)
         db.commit()
         alert_success(request, "Transação excluída com sucesso!")
     except Exception as e:
@@ -845,102 +835,104 @@ def upload_transactions(
 ):
     """
     Importa transações em massa via arquivo XLSX (Usar o Modelo).
-    - Se for recorrente e não tiver data final, criar até o final do ano.
+    - Se for recorrente, criar até a data final ou até o horizonte (RECURRING_HORIZON_MONTHS).
     - Se for parcelado, adicionar a parcela na descrição e criar as transações das parcelas restantes.
+
+    O arquivo é copiado para disco e lido linha a linha (openpyxl read_only); as linhas vão
+    para o banco em lotes de UPLOAD_BATCH_SIZE, com um único commit no final.
     """
     try:
-        # Ler arquivo Excel
-        contents = file.file.read()
-        df = pd.read_excel(io.BytesIO(contents), sheet_name="Transações")
-
         # Buscar listas auxiliares
         account_names = {
             a.name: a for a in db.query(Account).filter(Account.user_id == user.id).all()
         }
         card_names = {c.name: c for c in db.query(Card).filter(Card.user_id == user.id).all()}
         category_names = {
-            c.name.strip() if not c.parent_id else f"{c.parent.name} > {c.name}".strip(): c.id
-            for c in db.query(Category).filter(Category.user_id == user.id).all()
+            c.full_name: c.id
+            for c in db.query(Category)
+            .filter(Category.user_id == user.id, Category.full_name.isnot(None))
+            .all()
         }
 
-        transactions = []
-        for index, row in df.iterrows():
-            if pd.isna(row["CONTA"]) or pd.isna(row["CATEGORIA"]) or pd.isna(row["VALOR"]):
-                continue
-
-            account = account_names.get(row["CONTA"])
-            if not account:
-                alert_error(request, f"Linha[{index+2}] Conta inválida")
-                return
-
-            card = card_names.get(row["CARTAO"]) if pd.notna(row["CARTAO"]) else None
-            if card and card.account_id != account.id:
-                alert_error(request, f"Linha[{index+2}] Cartão inválido")
-                return
-
-            category_id = category_names.get(row["CATEGORIA"].strip())
-            if not category_id:
-                alert_error(request, f"Linha[{index+2}] Categoria inválida")
-                return
-
-            description = row["DESCRICAO"]
-            value = row["VALOR"]
-            due_at = row["DATA_VENCIMENTO"]
-            paid_at = row["DATA_PAGAMENTO"] if pd.notna(row["DATA_PAGAMENTO"]) else None
-            is_recurring = str(row["É_RECORRENTE?"]).strip().lower() == "sim"
-
-            # Tratar frequência de recorrência corretamente
-            recurring_frequency = row["FREQUENCIA_RECORRENCIA"] if is_recurring else None
-            if pd.isna(recurring_frequency) or recurring_frequency not in [
-                "semanal",
-                "mensal",
-                "anual",
-            ]:
-                recurring_frequency = None
-
-            recurring_end_date = row["DATA_FINAL_RECORRENCIA"] if is_recurring else None
-            if pd.isna(recurring_end_date):
-                recurring_end_date = None
-            is_installment = str(row["É_PARCELADO?"]).strip().lower() == "sim"
-            total_installments = (
-                int(row["QUANTIDADE_PARCELAS"])
-                if is_installment and pd.notna(row["QUANTIDADE_PARCELAS"])
-                else None
-            )
-            current_installment = (
-                int(row["PARCELA_ATUAL"])
-                if is_installment and pd.notna(row["PARCELA_ATUAL"])
-                else None
-            )
+        imported = 0
+        with spooled_upload(file) as path:
+            for batch in batched(iter_sheet_rows(path, "Transações"), UPLOAD_BATCH_SIZE):
+                items = []
+                for line, row in batch:
+                    if any(is_blank(row[column]) for column in ("CONTA", "CATEGORIA", "VALOR")):
+                        continue
+
+                    account = account_names.get(row["CONTA"])
+                    if not account:
+                        alert_error(request, f"Linha[{line}] Conta inválida")
+                        db.rollback()
+                        return
+
+                    card = card_names.get(row["CARTAO"]) if not is_blank(row["CARTAO"]) else None
+                    if card and card.account_id != account.id:
+                        alert_error(request, f"Linha[{line}] Cartão inválido")
+                        db.rollback()
+                        return
+
+                    category_id = category_names.get(str(row["CATEGORIA"]).strip())
+                    if not category_id:
+                        alert_error(request, f"Linha[{line}] Categoria inválida")
+                        db.rollback()
+                        return
+
+                    is_recurring = str(row["É_RECORRENTE?"]).strip().lower() == "sim"
+                    # Tratar frequência de recorrência corretamente
+                    recurring_frequency = row["FREQUENCIA_RECORRENCIA"] if is_recurring else None
+                    if recurring_frequency not in ["semanal", "mensal", "anual"]:
+                        recurring_frequency = None
+                    recurring_end_date = (
+                        cell_date(row["DATA_FINAL_RECORRENCIA"]) if is_recurring else None
+                    )
+                    is_installment = str(row["É_PARCELADO?"]).strip().lower() == "sim"
+                    total_installments = (
+                        int(row["QUANTIDADE_PARCELAS"])
+                        if is_installment and not is_blank(row["QUANTIDADE_PARCELAS"])
+                        else None
+                    )
+                    current_installment = (
+                        int(row["PARCELA_ATUAL"])
+                        if is_installment and not is_blank(row["PARCELA_ATUAL"])
+                        else None
+                    )
 
-            if is_installment and is_recurring:
-                alert_error(
-                    request, f"Linha[{index+2}] Transação não pode ser recorrente e parcelada"
-                )
-                return
-
-            transactions.extend(
-                create_transactions(
-                    user,
-                    db,
-                    account,
-                    card,
-                    category_id,
-                    description,
-                    value,
-                    due_at,
-                    paid_at,
-                    is_recurring,
-                    recurring_frequency,
-                    recurring_end_date,
-                    is_installment,
-                    total_installments,
-                    current_installment,
-                )
-            )
+                    if is_installment and is_recurring:
+                        alert_error(
+                            request,
+                            f"Linha[{line}] Transação não pode ser recorrente e parcelada",
+                        )
+                        db.rollback()
+                        return
+
+                    items.append(
+                        transaction_chain(
+                            user,
+                            account,
+                            card,
+                            category_id,
+                            row["DESCRICAO"],
+                            row["VALOR"],
+                            cell_date(row["DATA_VENCIMENTO"]),
+                            cell_datetime(row["DATA_PAGAMENTO"]),
+                            is_recurring,
+                            recurring_frequency,
+                            recurring_end_date,
+                            is_installment,
+                            total_installments,
+                            current_installment,
+                        )
+                    )
+
+                # Lote inteiro (séries e ocorrências) em poucos INSERTs; sem commit ainda
+                imported += len(insert_series(db, user.id, items))
 
-        # Salvar transações no banco
-        alert_success(request, f"{len(transactions)} Transações importadas com sucesso!")
+        # Salvar transações no banco (a planilha inteira ou nada)
+        db.commit()
+        alert_success(request, f"{imported} Transações importadas com sucesso!")
 
     except Exception as e:
         db.rollback()
@@ -950,19 +942,6 @@ def upload_transactions(
     return
 
 
-def cleanup_next_transactions(db, parent_id):
-    while parent_id:
-        sub_transaction = (
-            db.query(Transaction).filter(Transaction.parent_id == parent_id).one_or_none()
-        )
-        if sub_transaction:
-            parent_id = sub_transaction.id
-            db.delete(sub_transaction)
-            db.commit()
-        else:
-            parent_id = None
-
-
 def create_transactions(
     user,
     db,
@@ -980,95 +959,143 @@ def create_transactions(
     total_installments,
     current_installment,
     parent_id=None,
+    series_id=None,
+    commit=True,
 ):
-    transactions = []
-    today = datetime.today()
-
-    transaction = Transaction(
-        user_id=user.id,
-        account_id=account.id,
-        card_id=card.id if card else None,
-        category_id=category_id,
-        description=(
-            f"({current_installment}/{total_installments}) {description}"
-            if is_installment
-            else description
-        ),
-        value=value,
-        due_at=due_at,
-        paid_at=paid_at,
-        is_recurring=is_recurring,
-        recurring_frequency=recurring_frequency,
-        installments=total_installments,
-        current_installment=current_installment,
-        parent_id=parent_id,
+    """Cria a transação e as ocorrências seguintes (recorrências ou parcelas) de uma só vez.
+
+    A série é inserida em lote e encadeada por `parent_id`; recorrências e parcelamentos
+    ganham (ou atualizam, com `series_id`) a regra em `transaction_series`. Com `commit=False`
+    o chamador decide quando confirmar.
+    """
+    rows, rule = transaction_chain(
+        user,
+        account,
+        card,
+        category_id,
+        description,
+        value,
+        due_at,
+        paid_at,
+        is_recurring,
+        recurring_frequency,
+        recurring_end_date,
+        is_installment,
+        total_installments,
+        current_installment,
     )
-    db.add(transaction)
-    db.commit()
-    db.refresh(transaction)
-    transactions.append(transaction)
-    # Criar transações recorrentes até o fim do ano
-    if is_recurring and recurring_frequency:
-        last_due = due_at
-        while not recurring_end_date or last_due.year == today.year:
-            if recurring_frequency == "semanal":
-                last_due += timedelta(days=7)
-            elif recurring_frequency == "mensal":
-                last_due = add_months(last_due, 1)
-            elif recurring_frequency == "bimestral":
-                last_due = add_months(last_due, 2)
-            elif recurring_frequency == "trimestral":
-                last_due = add_months(last_due, 3)
-            elif recurring_frequency == "semestral":
-                last_due = add_months(last_due, 6)
-            elif recurring_frequency == "anual":
-                last_due = add_months(last_due, 12)
-            else:
-                break  # Frequência não reconhecida
-            if int(last_due.year) > int(today.year):
-                break
-
-                # Verificar se ultrapassou a data final, se houver
-            if recurring_end_date and last_due > recurring_end_date:
-                break
-
-            transaction = Transaction(
-                user_id=user.id,
-                account_id=account.id,
-                card_id=card.id if card else None,
-                category_id=category_id,
-                description=description,
-                value=value,
-                due_at=last_due,
-                is_recurring=True,
-                recurring_frequency=recurring_frequency,
-                parent_id=transactions[-1].id,
+    first_index = None
+    if rule is not None:
+        series_id = save_series(db, user.id, series_id, **rule)
+        first_index = 0 if rule.get("virtual") else None
+    transactions = insert_chain(
+        db, rows, parent_id=parent_id, series_id=series_id, first_index=first_index
+    )
+    if commit:
+        db.commit()
+    return transactions
+
+
+def transaction_chain(
+    user,
+    account,
+    card,
+    category_id,
+    description,
+    value,
+    due_at,
+    paid_at,
+    is_recurring,
+    recurring_frequency,
+    recurring_end_date,
+    is_installment,
+    total_installments,
+    current_installment,
+):
+    """Linhas da transação e das ocorrências seguintes, mais a regra da série (ou None).
+
+    Com RECURRING_VIRTUAL a recorrência grava só a primeira ocorrência e a regra; as demais
+    são geradas nas consultas (`core.occurrences`).
+    """
+    virtual = RECURRING_VIRTUAL and is_recurring and recurring_frequency in FREQUENCIES
+    base = {
+        "user_id": user.id,
+        "account_id": account.id,
+        "card_id": card.id if card else None,
+        "category_id": category_id,
+        "value": value,
+    }
+    rows = [
+        {
+            **base,
+            "description": (
+                f"({current_installment}/{total_installments}) {description}"
+                if is_installment
+                else description
+            ),
+            "due_at": due_at,
+            "paid_at": paid_at,
+            "is_recurring": is_recurring,
+            "recurring_frequency": recurring_frequency,
+            "installments": total_installments,
+            "current_installment": current_installment,
+        }
+    ]
+    # Criar transações recorrentes até o horizonte; core.rollover estende as séries abertas
+    if is_recurring and recurring_frequency in FREQUENCIES and not virtual:
+        horizon = recurrence_horizon()
+        last_due = next_occurrence_date(due_at, recurring_frequency)
+        while last_due <= horizon and (not recurring_end_date or last_due <= recurring_end_date):
+            rows.append(
+                {
+                    **base,
+                    "description": description,
+                    "due_at": last_due,
+                    "paid_at": None,
+                    "is_recurring": True,
+                    "recurring_frequency": recurring_frequency,
+                    "installments": None,
+                    "current_installment": None,
+                }
             )
-            db.add(transaction)
-            db.commit()
-            db.refresh(transaction)
-            transactions.append(transaction)
+            last_due = next_occurrence_date(last_due, recurring_frequency)
 
     # Criar parcelas futuras
     if is_installment and total_installments and current_installment:
         for installment in range(current_installment + 1, total_installments + 1):
             months_to_add = installment - current_installment
-            new_due_at = add_months(due_at, months_to_add)
-            transaction = Transaction(
-                user_id=user.id,
-                account_id=account.id,
-                card_id=card.id if card else None,
-                category_id=category_id,
-                description=f"({installment}/{total_installments}) {description}",
-                value=value,
-                due_at=new_due_at,
-                is_recurring=False,
-                installments=total_installments,
-                current_installment=installment,
-                parent_id=transactions[-1].id,
+            rows.append(
+                {
+                    **base,
+                    "description": f"({installment}/{total_installments}) {description}",
+                    "due_at": add_months(due_at, months_to_add),
+                    "paid_at": None,
+                    "is_recurring": False,
+                    "recurring_frequency": None,
+                    "installments": total_installments,
+                    "current_installment": installment,
+                }
             )
-            db.add(transaction)
-            db.commit()
-            db.refresh(transaction)
-            transactions.append(transaction)
-    return transactions
+
+    rule = None
+    if virtual:
+        rule = {
+            "frequency": recurring_frequency,
+            "end_date": recurring_end_date,
+            "description": description,
+            "virtual": True,
+            "start_date": due_at,
+            "account_id": base["account_id"],
+            "card_id": base["card_id"],
+            "category_id": category_id,
+            "value": value,
+        }
+    elif (is_recurring and recurring_frequency) or is_installment:
+        rule = {
+            "frequency": recurring_frequency,
+            "end_date": recurring_end_date,
+            "total_installments": total_installments,
+            "description": description,
+            "generated_until": rows[-1]["due_at"] if is_recurring else None,
+        }
+    return rows, rule